@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from __init__ import __version__
+
+# Options each generator is benchmarked with, on top of the seed
+VARIANTS = {
+    "default": {},
+    "realtime": {"realtime": True},
+    "baddata": {"baddata": 20},
+}
+
+# Paths of the CLIs timed by the startup benchmark
+HERE = Path(__file__).resolve().parent
+
+app = typer.Typer(add_completion=False)
+
+
+def _measure(logtype: str, iterations: int, options: dict) -> dict:
+    """Generate to /dev/null in a fresh process and measure it."""
+    import generators
+
+    started = time.perf_counter()
+    log_generator = getattr(generators, logtype)(
+        iterations=iterations,
+        epoch=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        **options,
+    )
+    ready = time.perf_counter()
+    size = 0
+    with open(os.devnull, "w") as devnull:
+        for _, rendered in log_generator.batches():
+            size += len(rendered.encode("utf-8"))
+            devnull.write(rendered)
+    seconds = time.perf_counter() - ready
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak *= 1 if sys.platform == "darwin" else 1024
+    return {
+        "startup_seconds": round(ready - started, 4),
+        "seconds": round(seconds, 4),
+        "lines_per_sec": round(iterations / seconds),
+        "bytes_per_sec": round(size / seconds),
+        "peak_rss_mb": round(peak / 2**20, 1),
+    }
+
+
+@app.command()
+def run(
+    iterations: int = typer.Option(
+        100000, "-i", "--iterations", help="Log lines to generate per case."
+    ),
+    seeds: List[int] = typer.Option(
+        [4321, 1], "-s", "--seed", help="Seed to run each case with, repeatable."
+    ),
+    repeat: int = typer.Option(
+        1, "--repeat", help="Runs per case, the fastest run is kept."
+    ),
+    logtypes: Optional[List[str]] = typer.Option(
+        None, "-l", "--logtype", help="Only benchmark these log types."
+    ),
+    output: Path = typer.Option(
+        Path("benchmark.json"), "-o", "--output", help="File to save results to."
+    ),
+):
+    """Benchmarks every generator, each case in its own process."""
+    import generators
+
+    names = [
+        name
+        for name in generators.log_types.names()
+        if not logtypes or name.lower() in logtypes
+    ]
+
+    results = {}
+    for name in names:
+        for variant, options in VARIANTS.items():
+            for seed in seeds:
+                case = f"{name.lower()}/{variant}/seed={seed}"
+                runs = []
+                for _ in range(repeat):
+                    # A new process per run keeps peak RSS and caches per case
+                    with ProcessPoolExecutor(
+                        1, mp_context=get_context("spawn")
+                    ) as pool:
+                        runs.append(
+                            pool.submit(
+                                _measure, name, iterations, options | {"seed": seed}
+                            ).result()
+                        )
+                results[case] = max(runs, key=lambda result: result["lines_per_sec"])
+                typer.echo(
+                    f"{case:<32} {results[case]['lines_per_sec']:>10,} lines/s "
+                    f"{results[case]['bytes_per_sec'] / 2**20:>8.1f} MiB/s "
+                    f"{results[case]['peak_rss_mb']:>8.1f} MiB peak RSS"
+                )
+
+    with open(output, "w") as file:
+        json.dump(
+            {
+                "version": __version__,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "iterations": iterations,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+
+
+def _first_line(command: list) -> float:
+    """Seconds from starting `command` to its first line of output."""
+    started = time.perf_counter()
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    ) as process:
+        process.stdout.readline()
+        elapsed = time.perf_counter() - started
+        process.kill()
+    return elapsed
+
+
+@app.command()
+def startup(
+    runs: int = typer.Option(5, "-n", "--runs", help="Runs per command."),
+    help_budget: float = typer.Option(
+        0.5, "--help-budget", help="Seconds allowed for `stream stdout --help`."
+    ),
+    line_budget: float = typer.Option(
+        1.5, "--line-budget", help="Seconds allowed until generate's first line."
+    ),
+):
+    """Times CLI startup against budgets, failing if any is over."""
+    commands = {
+        "stream stdout --help": (
+            [sys.executable, str(HERE / "stream.py"), "stdout", "--help"],
+            help_budget,
+        ),
+        "generate first line": (
+            [
+                sys.executable,
+                str(HERE / "generate.py"),
+                "-l",
+                "apache",
+                "-i",
+                "1000000",
+                "-q",
+            ],
+            line_budget,
+        ),
+    }
+    over = 0
+    for name, (command, budget) in commands.items():
+        elapsed = statistics.median(_first_line(command) for _ in range(runs))
+        over += elapsed > budget
+        typer.echo(
+            f"{name:<24} {elapsed:>6.3f}s (budget {budget:.3f}s)"
+            f"{'  OVER BUDGET' if elapsed > budget else ''}"
+        )
+    if over:
+        raise typer.Exit(1)
+
+
+@app.command()
+def compare(
+    baseline: typer.FileText = typer.Argument(..., help="Results to compare against."),
+    candidate: typer.FileText = typer.Argument(..., help="Results to check."),
+    threshold: float = typer.Option(
+        5, "-t", "--threshold", help="Percentage slowdown counted as a regression."
+    ),
+):
+    """Compares two benchmark results, failing on any throughput regression."""
+    baseline, candidate = json.load(baseline), json.load(candidate)
+    regressions = 0
+    for case, result in candidate["results"].items():
+        if case not in baseline["results"]:
+            continue
+        before = baseline["results"][case]["lines_per_sec"]
+        change = (result["lines_per_sec"] - before) / before * 100
+        regressed = change < -threshold
+        regressions += regressed
+        typer.echo(
+            f"{case:<32} {before:>10,} -> {result['lines_per_sec']:>10,} lines/s "
+            f"{change:>+7.1f}%{'  REGRESSION' if regressed else ''}"
+        )
+    if regressions:
+        typer.echo(f"{regressions} case(s) slower by more than {threshold}%.", err=True)
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import AnyStr, BinaryIO, Iterator
+
+import numpy as np
+
+# Line offsets are handed out in chunks so replay never builds a list per line
+REPLAY_CHUNK = 10000
+
+
+def corpus_name(logtype: str, **options) -> str:
+    """Cache file name for the lines a set of generator options produce.
+
+    The log type, seed, iterations and bad data percentage are kept readable,
+    every other option is folded into a short hash.
+
+    Args:
+        logtype (str): Name of the log type, or of the custom format.
+        **options: Arguments for the log generator.
+
+    Returns:
+        str: File name of the corpus, without a suffix.
+    """
+    named = ("seed", "iterations", "baddata")
+    others = json.dumps(
+        {k: v for k, v in options.items() if k not in named},
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha1(others.encode("utf-8")).hexdigest()[:12]
+    seed, iterations, baddata = (options.get(k) for k in named)
+    return f"{logtype.lower()}-s{seed}-i{iterations}-b{baddata or 0}-{digest}"
+
+
+class CorpusWriter:
+    def __init__(self, path: Path, file: BinaryIO):
+        """Writes generated lines to a corpus while passing them on to `file`.
+
+        The lines and the offsets of their ends are written to temporary
+        files, which only replace the corpus once the run has finished.
+
+        Args:
+            path (Path): Path of the corpus log file.
+            file (BinaryIO): Binary file to pass the lines on to.
+        """
+        self.path = path
+        self.file = file
+        self.partial = path.with_suffix(".log.tmp")
+        self.data = open(self.partial, "wb")
+        self.offsets = [np.zeros(1, dtype=np.uint64)]
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.data.close()
+        if type is not None:
+            os.remove(self.partial)
+            return
+        index = self.path.with_suffix(".npy.tmp")
+        with open(index, "wb") as file:
+            np.save(file, np.concatenate(self.offsets))
+        os.replace(index, self.path.with_suffix(".npy"))
+        os.replace(self.partial, self.path)
+
+    def write(self, lines: AnyStr):
+        if isinstance(lines, str):
+            lines = lines.encode("utf-8")
+        ends = np.flatnonzero(np.frombuffer(lines, dtype=np.uint8) == 10)
+        self.offsets.append(ends.astype(np.uint64) + np.uint64(self.size + 1))
+        self.size += len(lines)
+        self.data.write(lines)
+        self.file.write(lines)
+
+
+class Corpus:
+    def __init__(self, path: Path):
+        """Cached log lines, replayed from a memory map.
+
+        A corpus is a log file with a NumPy index of line offsets beside it,
+        so any range of lines can be found without scanning the file.
+
+        Args:
+            path (Path): Path of the corpus log file.
+
+        Raises:
+            FileNotFoundError: If the log file or its index doesn't exist.
+        """
+        self.path = Path(path)
+        self.offsets = np.load(self.path.with_suffix(".npy"), mmap_mode="r")
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self.data = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def shard(self, start: int, end: int, shard: int = 0, shards: int = 1) -> tuple:
+        """Line range of one of `shards` even splits of the lines start:end.
+
+        Args:
+            start (int): First line of the range.
+            end (int): End of the range, exclusive, clipped to the corpus.
+            shard (int, optional): Index of the shard. Defaults to 0.
+            shards (int, optional): Number of shards. Defaults to 1.
+
+        Returns:
+            tuple: First line and end of the shard.
+        """
+        start, end = min(start, len(self)), min(end, len(self))
+        lines = max(end - start, 0)
+        return start + lines * shard // shards, start + lines * (shard + 1) // shards
+
+    def lines(self, start: int, end: int, binary: bool = True) -> Iterator:
+        """Replay the lines start:end.
+
+        Args:
+            start (int): First line.
+            end (int): End of the lines, exclusive.
+            binary (bool, optional): Yield bytes, else decode to str.
+            Defaults to True.
+
+        Yields:
+            Iterator: The newline terminated lines as bytes or str.
+        """
+        for first in range(start, end, REPLAY_CHUNK):
+            offsets = self.offsets[first : min(first + REPLAY_CHUNK, end) + 1].tolist()
+            for begin, stop in zip(offsets, offsets[1:]):
+                line = self.data[begin:stop]
+                yield line if binary else line.decode("utf-8")
+
+    def write(self, file: BinaryIO):
+        """Write the whole corpus to a binary file."""
+        file.write(self.data)
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 
 import sys
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Optional
+from pathlib import Path
+from typing import List, Optional
 
 import generators
 import typer
 from __init__ import version_callback
+from corpus import Corpus, CorpusWriter, corpus_name
+from generators.base import LogRender
+from generators.mutate import Mutator
+from generators.parallel import render_parallel
+from generators.template import Template
 
 
-class AvailableLogTypes(str, Enum):
-    apache = "Apache"
-    cloudfront = "Cloudfront"
-    cloudflare = "Cloudflare"
+class ClientActivity(str, Enum):
+    zipf = "zipf"
+    uniform = "uniform"
+
+
+class MergeModes(str, Enum):
+    ordered = "ordered"
+    unordered = "unordered"
 
 
 app = typer.Typer(add_completion=False)
@@ -20,27 +32,86 @@ app = typer.Typer(add_completion=False)
 
 @app.command()
 def generate(
-    log_type: AvailableLogTypes = typer.Option(
-        ..., "-l", "--logtype", case_sensitive=False, help="Type of log to generate."
+    log_type: Optional[str] = typer.Option(
+        None,
+        "-l",
+        "--logtype",
+        help="Type of log to generate, one of "
+        f"{', '.join(name.lower() for name in generators.__all__)} or a plugin.",
+    ),
+    format_file: Optional[typer.FileText] = typer.Option(
+        None,
+        "-f",
+        "--format-file",
+        help="Path to a file with a custom log format to generate.",
     ),
     iterations: int = typer.Option(
         1, "-i", "--iterations", help="Iterations of log lines to generate."
     ),
+    start: Optional[int] = typer.Option(
+        0, "--start", help="Index of the first log line, to resume or split a run."
+    ),
     quiet: Optional[bool] = typer.Option(
         False, "-q", "--quiet", help="Hide the progress bar."
     ),
     realtime: Optional[bool] = typer.Option(
         False, "-r", "--realtime", help="Interpolate current timestamps in log lines."
     ),
+    density: Optional[float] = typer.Option(
+        100, "-d", "--density", help="Log lines per second of simulated time."
+    ),
+    epoch: Optional[datetime] = typer.Option(
+        None, "--epoch", help="Start of simulated time in UTC, defaults to now."
+    ),
+    clients: Optional[int] = typer.Option(
+        10000, "-c", "--clients", help="Number of simulated clients making requests."
+    ),
+    activity: ClientActivity = typer.Option(
+        ClientActivity.zipf,
+        "--activity",
+        case_sensitive=False,
+        help="How requests are spread across clients.",
+    ),
+    exponent: Optional[float] = typer.Option(
+        1.0,
+        "--zipf-exponent",
+        help="Skew of zipf activity towards the busiest clients.",
+    ),
     baddata: Optional[float] = typer.Option(
         None,
         "-b",
         "--baddata",
         help="Generate percentage of bad data to mix in with good data (e.g. 50 = 50%)",
     ),
+    corruption: Optional[List[str]] = typer.Option(
+        None,
+        "--corrupt",
+        help="Field=Percentage of bad lines to corrupt the field in, defaults to 100.",
+    ),
     seed: Optional[int] = typer.Option(
         4321, "-s", "--seed", help="Reproducible seed to generate fake data with."
     ),
+    pool_size: Optional[int] = typer.Option(
+        1000,
+        "--pool-size",
+        help="Fake values to pre-generate per field, more is slower to start.",
+    ),
+    workers: Optional[int] = typer.Option(
+        1, "-w", "--workers", min=1, help="Worker processes to generate with."
+    ),
+    merge: MergeModes = typer.Option(
+        MergeModes.ordered,
+        "--merge",
+        case_sensitive=False,
+        help="Write worker output in a reproducible order, or as soon as it's ready.",
+    ),
+    cache_dir: Optional[Path] = typer.Option(
+        None,
+        "--cache-dir",
+        exists=True,
+        file_okay=False,
+        help="Directory to cache runs in, a repeated run is replayed from the cache.",
+    ),
     position: Optional[int] = typer.Option(
         0,
         "-p",
@@ -53,10 +124,78 @@ def generate(
 ):
     """Generates log lines to stdout."""
 
-    log_generator = getattr(generators, log_type.value)
-    log_generator(
-        iterations=iterations, realtime=realtime, baddata=baddata, seed=seed
-    ).render(file=sys.stdout, quiet=quiet, position=position)
+    if format_file:
+        log_generator = LogRender
+        log_format = format_file.read().rstrip("\n")
+        try:
+            Template(log_format)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--format-file")
+    elif log_type:
+        try:
+            log_generator = generators.log_types.load(log_type)
+        except KeyError:
+            raise typer.BadParameter(
+                f"Unknown log type '{log_type}'.", param_hint="--logtype"
+            )
+        log_format = None
+    else:
+        raise typer.BadParameter(
+            "Either --logtype or --format-file is required.", param_hint="--logtype"
+        )
+
+    # Strip the field/percentage pairs into a dict of corruption rates
+    pairs = [x.partition("=") for x in corruption or []]
+    try:
+        if not all(separator for _, separator, _ in pairs):
+            raise ValueError("Expected Field=Percentage pairs, e.g. user_name=50.")
+        corruption = {field: float(rate) for field, _, rate in pairs}
+        Mutator(corruption)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--corrupt")
+
+    options = dict(
+        iterations=iterations,
+        start=start,
+        realtime=realtime,
+        density=density,
+        epoch=epoch or datetime.now(timezone.utc),
+        clients=clients,
+        activity=activity.value,
+        exponent=exponent,
+        baddata=baddata,
+        corruption=corruption,
+        seed=seed,
+        pool_size=pool_size,
+        format=log_format,
+    )
+
+    output = nullcontext(sys.stdout.buffer if workers > 1 else sys.stdout)
+    # Only runs that always give the same lines can be cached
+    if cache_dir and not realtime and (workers == 1 or merge == MergeModes.ordered):
+        # Without --epoch the first run's timestamps are replayed
+        name = corpus_name(
+            log_type if log_type else "custom", **(options | dict(epoch=epoch))
+        )
+        path = cache_dir / f"{name}.log"
+        if path.exists():
+            Corpus(path).write(sys.stdout.buffer)
+            return
+        output = CorpusWriter(path, sys.stdout.buffer)
+
+    with output as file:
+        if workers > 1:
+            render_parallel(
+                log_generator,
+                workers=workers,
+                ordered=merge == MergeModes.ordered,
+                file=file,
+                quiet=quiet,
+                position=position,
+                **options,
+            )
+        else:
+            log_generator(**options).render(file=file, quiet=quiet, position=position)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,26 @@
 """Generators
 
 This module exposes generators for the generator utility to use to write to stdout.
+Each generator is only imported when it's first used, and other packages can add
+generators through the `log_generator.generators` entry point group.
 """
 
-from generators.apache import Apache
-from generators.cloudflare import Cloudflare
-from generators.cloudfront import Cloudfront
+from registry import Registry
 
-__all__ = [Apache, Cloudfront, Cloudflare]
+log_types = Registry(
+    "log_generator.generators",
+    {
+        "Apache": "generators.apache:Apache",
+        "Cloudfront": "generators.cloudfront:Cloudfront",
+        "Cloudflare": "generators.cloudflare:Cloudflare",
+    },
+)
+
+__all__ = list(log_types.builtin)
+
+
+def __getattr__(name: str):
+    try:
+        return log_types.load(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
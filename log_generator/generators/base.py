@@ -1,173 +1,130 @@
-import datetime as dt
-from random import choices
+from typing import Iterator
 
-from cachetools import TTLCache, cached
+import numpy as np
 from faker import Faker
+from generators.clock import Clock
+from generators.mutate import Mutator
+from generators.pool import ValuePool
+from generators.population import Population
+from generators.template import Template
 from loguru import logger
-from tqdm import tqdm, trange
+from tqdm import tqdm
 
 # Remove standard handler and write loguru lines via tqdm.write
 logger.remove()
 logger.add(lambda msg: tqdm.write(msg, end=""))
 
 
-valid_log_data_cache = TTLCache(1, 1)
-bad_log_data_cache = TTLCache(1, 1)
+# Rows are sampled from the value pools this many at a time
+BLOCK_SIZE = 10000
 
 
 class LogRender:
+    # Log line format, see generators.template.Template
+    format = None
+
     def __init__(self, **kwargs):
         self.iterations = kwargs.get("iterations")
         self.realtime = kwargs.get("realtime")
         self.junk_percentage = kwargs.get("baddata")
-        self.init_timestamp = dt.datetime.now()
-        self.fake = Faker()
-        Faker.seed(kwargs.get("seed"))
-
-    @staticmethod
-    def _seed_data(fake, realtime, timestamp):
-        static_data = {
-            "host": "example.com",  # fake.domain_name(),
-        }
-
-        @cached(cache=valid_log_data_cache)
-        def semi_static_gen(fake, realtime, timestamp):
-            if realtime:
-                timestamp = dt.datetime.now()
-
-            return {
-                "ip_address": fake.ipv4_public(),
-                "user_name": fake.random_element(elements=("-", fake.user_name())),
-                "http_protocol": fake.random_element(elements=("HTTP/1.1", "HTTP/2.0")),
-                "timestamp": timestamp,
-                "http_method": fake.http_method(),
-                "referer": fake.uri(),
-                "user_agent": fake.user_agent(),
-                "loc": fake.bank_country().lower(),
-            }
-
-        def random_gen(fake, realtime, timestamp):
-            return {
-                "uri_path": fake.uri_path(),
-                "uri_query_params": fake.random_element(
-                    elements=(
-                        "",
-                        "?a=1,b=2,c=3",
-                        "?cat=lovely",
-                        "?e=two&f=1",
-                        "?end=1",
-                        "?q=2",
-                    )
-                ),
-                "http_status": fake.random_element(
-                    elements=(200, 201, 301, 302, 303, 400, 401, 404, 500, 502)
-                ),
-                "transfer_size": fake.random_element(elements=("-", fake.random_int())),
-                "request_time": fake.random_element(
-                    elements=("-", round(fake.random.random() / 10, 3))
-                ),
-                "uuid": fake.uuid4(),
-            }
-
-        return (
-            static_data
-            | semi_static_gen(fake, realtime, timestamp)
-            | random_gen(fake, realtime, timestamp)
+        self.seed = kwargs.get("seed")
+        # Unseeded runs still need one key for all of their block streams
+        if self.seed is None:
+            self.seed = int(np.random.SeedSequence().entropy % 2**63)
+        self.clock = Clock(
+            start=kwargs.get("epoch"),
+            density=kwargs.get("density") or 100,
+            realtime=self.realtime,
         )
-
-    @staticmethod
-    def _seed_bad_data(fake, realtime, timestamp):
-        @cached(cache=bad_log_data_cache)
-        def semi_static_gen(fake, realtime, timestamp):
-            if realtime:
-                timestamp = dt.datetime.now()
-
-            return {
-                "timestamp": timestamp,
-                "ip_address": fake.random_element(
-                    elements=("", "NOT-AN-IP", "256.500.301.9000", "1")
-                ),
-                "user_name": fake.random_element(
-                    elements=("-", "bad-username", "a-really-long-username" * 256)
-                ),
-                "http_method": fake.random_element(
-                    elements=("THROW", "EAT", "DRINK", "BLAH")
-                ),
-                "referer": f"!?£$%^&*()-_{fake.uri()}",
-                "user_agent": f"!£$%^&*()-_+{fake.user_agent()}",
-                "loc": fake.random_element(elements=("", 100, "123")),
-                "host": fake.random_element(
-                    elements=(
-                        "",
-                        123,
-                        "!£$%^&*()-_",
-                        "www.example.long.url.co.uk.org.biz.tv",
-                    )
-                ),
-            }
-
-        def random_gen(fake, realtime, timestamp):
-            return {
-                "uri_path": f"!?£$%^&*()-_{fake.uri_path()}",
-                "uri_query_params": fake.random_element(
-                    elements=(
-                        "",
-                        "!!a=1,b=2,c=3",
-                        "%cat=lovely",
-                        "-----=two&f=1",
-                        "$$end=1",
-                        "^^q=2",
-                    )
-                ),
-                "http_protocol": fake.random_element(elements=("HTTP/5.0", "PTTH/0.1")),
-                "http_status": fake.random_element(
-                    elements=(1, 25, 91, 602, 603, 700, 701, 804, 900, 1000)
-                ),
-                "transfer_size": fake.random_element(
-                    elements=("-", "not-a-number", fake.binary(length=64))
-                ),
-                "request_time": fake.random_element(
-                    elements=(
-                        "-",
-                        "",
-                        "long_time",
-                        f'!"£$%^&*()-_{round(fake.random.random() / 10, 3)}',
-                    )
-                ),
-                "uuid": f"!£$%^&*()-_+{fake.uuid4()}",
-            }
-
-        return semi_static_gen(fake, realtime, timestamp) | random_gen(
-            fake, realtime, timestamp
+        self.start = kwargs.get("start") or 0
+        self.line = self.start
+        self.fake = Faker()
+        self.pool = ValuePool(self.fake, kwargs.get("pool_size") or 1000, self.seed)
+        self.population = Population(
+            self.pool,
+            np.random.default_rng(self.seed),
+            size=kwargs.get("clients") or 10000,
+            activity=kwargs.get("activity") or "zipf",
+            exponent=kwargs.get("exponent") or 1.0,
         )
+        self.template = Template(kwargs.get("format") or self.format)
+        # Only the fields the format uses are sampled
+        self.fields = {field for field, _ in self.template.slots}
+        self.mutator = Mutator(kwargs.get("corruption"))
+
+    def _block_rng(self, block: int) -> np.random.Generator:
+        """Counter-based random stream for one block of lines.
+
+        The stream is keyed on the seed and the block's index in the run, so
+        any block can be rendered without rendering the ones before it.
+
+        Args:
+            block (int): Index of the block, counting BLOCK_SIZE lines from 0.
+
+        Returns:
+            np.random.Generator: Random generator for the block.
+        """
+        return np.random.Generator(np.random.Philox(key=[self.seed % 2**64, block]))
+
+    def _render_block(self, block: int, offset: int, n: int) -> str:
+        # The whole block is sampled so the lines don't depend on where a
+        # run starts, only the requested lines are rendered
+        rng = self._block_rng(block)
+        columns = self.pool.sample(rng, BLOCK_SIZE, self.fields)
+        columns |= self.population.sample(rng, BLOCK_SIZE, self.fields)
+        if "host" in self.fields:
+            columns["host"] = ["example.com"] * BLOCK_SIZE
+        if self.junk_percentage:
+            bad = rng.random(BLOCK_SIZE) < self.junk_percentage / 100
+            self.mutator.mutate(columns, bad, rng)
+
+        columns = {
+            field: values[offset : offset + n] for field, values in columns.items()
+        }
+        columns["timestamp"] = self.clock.timestamps(block * BLOCK_SIZE + offset, n)
+        return self.template.render(columns, n)
+
+    def render_batch(self, n: int) -> str:
+        """Render the next log lines of the run.
+
+        Line i of a run is the same for a given seed however the run is split
+        up, so any range of lines can be rendered on its own.
+
+        Args:
+            n (int): Number of log lines to render.
+
+        Returns:
+            str: The log lines, newline terminated and joined into one string.
+        """
+        rendered = []
+        end = self.line + n
+        while self.line < end:
+            block, offset = divmod(self.line, BLOCK_SIZE)
+            lines = min(BLOCK_SIZE - offset, end - self.line)
+            rendered.append(self._render_block(block, offset, lines))
+            self.line += lines
+        return "".join(rendered)
+
+    def batches(self) -> Iterator[tuple]:
+        """Render the run's lines in blocks, forever if iterations is None.
+
+        Yields:
+            tuple: Number of lines and the rendered lines of each block.
+        """
+        end = None if self.iterations is None else self.start + self.iterations
+        while end is None or self.line < end:
+            lines = BLOCK_SIZE - self.line % BLOCK_SIZE
+            if end is not None:
+                lines = min(lines, end - self.line)
+            yield lines, self.render_batch(lines)
 
     def render(self, **kwargs):
         file = kwargs.get("file")
         quiet = kwargs.get("quiet")
         position = kwargs.get("position")
 
-        def write(data=None):
-            if not self.junk_percentage:
-                data = self._seed_data(self.fake, self.realtime, self.init_timestamp)
-            else:
-                if bool(
-                    choices(
-                        [0, 1],
-                        weights=[self.junk_percentage, 100 - self.junk_percentage],
-                        k=1,
-                    )[0]
-                ):
-                    data = self._seed_data(
-                        self.fake, self.realtime, self.init_timestamp
-                    )
-                else:
-                    data = self._seed_bad_data(
-                        self.fake, self.realtime, self.init_timestamp
-                    )
-            print(self.generate(data), file=file)
-
-        for _ in trange(
-            self.iterations,
+        with tqdm(
+            total=self.iterations,
             disable=quiet,
             unit="lines",
             desc="Generating",
@@ -175,5 +132,7 @@ class LogRender:
             position=position,
             mininterval=0.5,
             maxinterval=1,
-        ):
-            write()
+        ) as progress:
+            for lines, rendered in self.batches():
+                file.write(rendered)
+                progress.update(lines)
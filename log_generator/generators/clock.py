@@ -0,0 +1,102 @@
+import datetime as dt
+import time
+
+import numpy as np
+
+
+class Timestamps:
+    def __init__(self, clock: "Clock", seconds: np.ndarray):
+        """Timestamps of a block of log lines, as epoch seconds.
+
+        Args:
+            clock (Clock): Clock the timestamps came from, for formatting.
+            seconds (np.ndarray): Non-decreasing epoch seconds, one per line.
+        """
+        self.clock = clock
+        self.seconds = seconds
+
+    def __len__(self) -> int:
+        return len(self.seconds)
+
+    def strftime(self, format_spec: str) -> list:
+        """Format the timestamps, calling strftime once per distinct second.
+
+        Args:
+            format_spec (str): strftime format.
+
+        Returns:
+            list: Formatted timestamp for each line.
+        """
+        # Seconds never go backwards, so each distinct second is one run
+        starts = np.flatnonzero(np.diff(self.seconds, prepend=-1))
+        counts = np.diff(starts, append=len(self.seconds))
+        formatted = np.array(
+            [
+                self.clock.strftime(int(second), format_spec)
+                for second in self.seconds[starts]
+            ],
+            dtype=object,
+        )
+        return np.repeat(formatted, counts).tolist()
+
+
+class Clock:
+    def __init__(
+        self, start: dt.datetime = None, density: float = 100, realtime: bool = False
+    ):
+        """Simulated clock giving each log line its timestamp.
+
+        Time advances by one second every `density` lines from `start`, or
+        follows the wall clock in realtime mode. Formatted timestamps are
+        memoized per format, so strftime only runs when the second changes.
+
+        Args:
+            start (dt.datetime, optional): Start of simulated time, naive times
+            are taken as UTC. Defaults to now.
+            density (float, optional): Log lines per simulated second.
+            Defaults to 100.
+            realtime (bool, optional): Use the current time instead.
+            Defaults to False.
+        """
+        start = start or dt.datetime.now(dt.timezone.utc)
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=dt.timezone.utc)
+        self.start = start.timestamp()
+        self.density = density
+        self.realtime = realtime
+        self.formatted = {}
+
+    def timestamps(self, line: int, n: int) -> Timestamps:
+        """Timestamps for a block of log lines.
+
+        Args:
+            line (int): Index of the first line in the block.
+            n (int): Number of lines in the block.
+
+        Returns:
+            Timestamps: Timestamps of the lines.
+        """
+        if self.realtime:
+            seconds = np.full(n, int(time.time()), dtype=np.int64)
+        else:
+            offsets = np.arange(line, line + n, dtype=np.float64) / self.density
+            seconds = np.floor(self.start + offsets).astype(np.int64)
+        return Timestamps(self, seconds)
+
+    def strftime(self, second: int, format_spec: str) -> str:
+        """Format an epoch second, reusing the last result for each format.
+
+        Args:
+            second (int): Epoch seconds.
+            format_spec (str): strftime format.
+
+        Returns:
+            str: Formatted UTC timestamp.
+        """
+        last = self.formatted.get(format_spec)
+        if last and last[0] == second:
+            return last[1]
+        timestamp = dt.datetime.fromtimestamp(second, dt.timezone.utc)
+        formatted = timestamp.strftime(format_spec)
+        self.formatted[format_spec] = (second, formatted)
+        return formatted
@@ -0,0 +1,108 @@
+import numpy as np
+
+
+def _choice(*values):
+    """Replace the value with one of `values`."""
+    options = np.array(values, dtype=object)
+
+    def corrupt(good: list, rng: np.random.Generator) -> list:
+        return options[rng.integers(0, len(options), len(good))].tolist()
+
+    return corrupt
+
+
+def _prefix(junk: str):
+    """Prepend `junk` to the value."""
+
+    def corrupt(good: list, rng: np.random.Generator) -> list:
+        return [f"{junk}{value}" for value in good]
+
+    return corrupt
+
+
+def _binary(length: int):
+    """Replace the value with `length` random bytes."""
+
+    def corrupt(good: list, rng: np.random.Generator) -> list:
+        return [str(rng.bytes(length)) for _ in good]
+
+    return corrupt
+
+
+def _any(*corruptions):
+    """Apply one of `corruptions`, picked at random for each value."""
+
+    def corrupt(good: list, rng: np.random.Generator) -> list:
+        picks = rng.integers(0, len(corruptions), len(good))
+        corrupted = list(good)
+        for pick, corruption in enumerate(corruptions):
+            rows = np.flatnonzero(picks == pick).tolist()
+            values = corruption([good[row] for row in rows], rng)
+            for row, value in zip(rows, values):
+                corrupted[row] = value
+        return corrupted
+
+    return corrupt
+
+
+# How each field of a good record is corrupted
+CORRUPTIONS = {
+    "host": _choice("", "123", "!£$%^&*()-_", "www.example.long.url.co.uk.org.biz.tv"),
+    "http_method": _choice("THROW", "EAT", "DRINK", "BLAH"),
+    "http_protocol": _choice("HTTP/5.0", "PTTH/0.1"),
+    "http_status": _choice(
+        "1", "25", "91", "602", "603", "700", "701", "804", "900", "1000"
+    ),
+    "ip_address": _choice("", "NOT-AN-IP", "256.500.301.9000", "1"),
+    "loc": _choice("", "100", "123"),
+    "referer": _prefix("!?£$%^&*()-_"),
+    "request_time": _any(_choice("-", "", "long_time"), _prefix('!"£$%^&*()-_')),
+    "transfer_size": _any(_choice("-", "not-a-number"), _binary(64)),
+    "uri_path": _prefix("!?£$%^&*()-_"),
+    "uri_query_params": _choice(
+        "", "!!a=1,b=2,c=3", "%cat=lovely", "-----=two&f=1", "$$end=1", "^^q=2"
+    ),
+    "user_agent": _prefix("!£$%^&*()-_+"),
+    "user_name": _choice("-", "bad-username", "a-really-long-username" * 256),
+    "uuid": _prefix("!£$%^&*()-_+"),
+}
+
+
+class Mutator:
+    def __init__(self, rates: dict = None):
+        """Turns good records into bad ones by corrupting their fields.
+
+        Args:
+            rates (dict, optional): Field name to the percentage of bad records
+            that have the field corrupted. Fields not given are always
+            corrupted. Defaults to None.
+
+        Raises:
+            ValueError: If a rate is given for a field that can't be corrupted.
+        """
+        rates = rates or {}
+        unknown = set(rates) - set(CORRUPTIONS)
+        if unknown:
+            raise ValueError(f"Can't corrupt unknown fields {', '.join(unknown)}.")
+        self.rates = {field: rates.get(field, 100) / 100 for field in CORRUPTIONS}
+
+    def mutate(self, columns: dict, bad: np.ndarray, rng: np.random.Generator):
+        """Corrupt the fields of the bad rows in a block, in place.
+
+        Args:
+            columns (dict): Field name to list of values for the block, fields
+            that aren't in it are skipped.
+            bad (np.ndarray): Boolean mask of the rows to corrupt.
+            rng (np.random.Generator): Random generator to corrupt with.
+        """
+        rows = np.flatnonzero(bad)
+        for field, rate in self.rates.items():
+            if field not in columns:
+                continue
+            targets = rows[rng.random(len(rows)) < rate].tolist()
+            if not targets:
+                continue
+            column = columns[field]
+            corrupted = CORRUPTIONS[field]([column[row] for row in targets], rng)
+            for row, value in zip(targets, corrupted):
+                column[row] = value
@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import BinaryIO
+
+from generators.base import BLOCK_SIZE
+from tqdm import tqdm
+
+# Lines rendered per task handed to a worker process
+SHARD_SIZE = 5 * BLOCK_SIZE
+
+_renderer = None
+
+
+def _init_worker(log_generator: type, kwargs: dict):
+    global _renderer
+    _renderer = log_generator(**kwargs)
+
+
+def _render_shard(start: int, lines: int) -> bytes:
+    _renderer.line = start
+    return _renderer.render_batch(lines).encode("utf-8")
+
+
+def render_parallel(
+    log_generator: type,
+    workers: int,
+    ordered: bool,
+    file: BinaryIO,
+    quiet: bool,
+    position: int,
+    **kwargs,
+):
+    """Render log lines across a pool of worker processes.
+
+    The iterations are split into shards of SHARD_SIZE lines, each rendered
+    by a worker and returned to the parent as a single block of bytes. Lines
+    only depend on the seed and their position, so ordered output is the same
+    as a single process run.
+
+    Args:
+        log_generator (type): LogRender subclass to generate with.
+        workers (int): Number of worker processes.
+        ordered (bool): Write shards in order, so a given seed always produces
+        the same output. Otherwise shards are written as soon as they are done.
+        file (BinaryIO): Binary file to write the log lines to.
+        quiet (bool): Hide the progress bar.
+        position (int): Position of the progress bar.
+        **kwargs: Arguments for the log generator.
+    """
+    iterations = kwargs["iterations"]
+    start = kwargs.get("start") or 0
+    end = start + iterations
+    # Shards are aligned to SHARD_SIZE lines so none of them splits a block
+    bounds = [start, *range((start // SHARD_SIZE + 1) * SHARD_SIZE, end, SHARD_SIZE)]
+    shards = [(first, last - first) for first, last in zip(bounds, bounds[1:] + [end])]
+    # Bound the rendered shards held in memory if the output can't keep up
+    max_pending = workers * 2
+
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(log_generator, kwargs)
+    ) as executor, tqdm(
+        total=iterations,
+        disable=quiet,
+        unit="lines",
+        desc="Generating",
+        unit_scale=True,
+        position=position,
+        mininterval=0.5,
+        maxinterval=1,
+    ) as progress:
+
+        def write(futures):
+            for future in futures:
+                file.write(future.result())
+                progress.update(pending.pop(future))
+
+        pending = {}
+        order = deque()
+        for first, lines in shards:
+            future = executor.submit(_render_shard, first, lines)
+            pending[future] = lines
+            if ordered:
+                order.append(future)
+            if len(pending) >= max_pending:
+                if ordered:
+                    write([order.popleft()])
+                else:
+                    write(wait(pending, return_when=FIRST_COMPLETED).done)
+
+        write(order if ordered else wait(pending).done)
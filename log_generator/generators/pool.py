@@ -0,0 +1,98 @@
+import numpy as np
+from faker import Faker
+
+QUERY_PARAMS = ("", "?a=1,b=2,c=3", "?cat=lovely", "?e=two&f=1", "?end=1", "?q=2")
+HTTP_STATUSES = ("200", "201", "301", "302", "303", "400", "401", "404", "500", "502")
+HTTP_PROTOCOLS = ("HTTP/1.1", "HTTP/2.0")
+
+# Attributes of a client, assigned once per client by the population
+CLIENT_FIELDS = ("user_name", "user_agent", "loc")
+
+
+class ValuePool:
+    def __init__(self, fake: Faker, size: int = 1000, seed: int = None):
+        """Pre-generated Faker values to sample log lines from.
+
+        Faker providers are slow, so each field is generated `size` times and
+        rows are drawn from the pools with numpy index arrays. A field's pool
+        is only built the first time it's used, with Faker seeded for that
+        field, so formats that don't use a field don't pay for it. Larger
+        pools give more varied values at the cost of a slower startup.
+
+        Args:
+            fake (Faker): Faker instance to build the pools with.
+            size (int, optional): Values per field. Defaults to 1000.
+            seed (int, optional): Seed the pools are built from.
+            Defaults to None.
+        """
+        self.fake = fake
+        self.size = size
+        self.seed = seed
+        self.providers = {
+            "user_name": lambda: fake.random_element(elements=("-", fake.user_name())),
+            "user_agent": fake.user_agent,
+            "loc": lambda: fake.bank_country().lower(),
+            "http_method": fake.http_method,
+            "referer": fake.uri,
+            "uri_path": fake.uri_path,
+        }
+        self.pools = {
+            "http_protocol": np.array(HTTP_PROTOCOLS, dtype=object),
+            "uri_query_params": np.array(QUERY_PARAMS, dtype=object),
+            "http_status": np.array(HTTP_STATUSES, dtype=object),
+        }
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if field not in self.pools:
+            self.fake.seed_instance(f"{self.seed}-{field}")
+            pool = np.empty(self.size, dtype=object)
+            pool[:] = [self.providers[field]() for _ in range(self.size)]
+            self.pools[field] = pool
+        return self.pools[field]
+
+    def sample(self, rng: np.random.Generator, n: int, fields: set) -> dict:
+        """Draw a block of per request fields as columns.
+
+        Args:
+            rng (np.random.Generator): Random generator to draw indexes with.
+            n (int): Number of rows to draw.
+            fields (set): Names of the fields to draw, others are left out.
+
+        Returns:
+            dict: Field name to list of `n` values.
+        """
+        columns = {
+            field: self[field][rng.integers(0, self.size, n)].tolist()
+            for field in ("http_method", "referer", "uri_path")
+            if field in fields
+        }
+        for field in ("http_protocol", "uri_query_params", "http_status"):
+            if field in fields:
+                pool = self.pools[field]
+                columns[field] = pool[rng.integers(0, len(pool), n)].tolist()
+
+        # Numeric fields are cheap to draw directly rather than from a pool
+        if "transfer_size" in fields:
+            columns["transfer_size"] = np.where(
+                rng.random(n) < 0.5, "-", rng.integers(0, 10000, n).astype(str)
+            ).tolist()
+        if "request_time" in fields:
+            columns["request_time"] = np.where(
+                rng.random(n) < 0.5, "-", np.round(rng.random(n) / 10, 3).astype(str)
+            ).tolist()
+        if "uuid" in fields:
+            columns["uuid"] = self._uuids(rng, n)
+        return columns
+
+    @staticmethod
+    def _uuids(rng: np.random.Generator, n: int) -> list:
+        # Version 4 UUIDs straight from random bytes, formatted from one hex dump
+        raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+        digits = raw.tobytes().hex()
+        return [
+            f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-{digits[i + 12:i + 16]}-"
+            f"{digits[i + 16:i + 20]}-{digits[i + 20:i + 32]}"
+            for i in range(0, 32 * n, 32)
+        ]
@@ -0,0 +1,105 @@
+import numpy as np
+from generators.pool import CLIENT_FIELDS, ValuePool
+
+# Private and reserved IPv4 networks as (address, prefix length)
+RESERVED_NETWORKS = (
+    (0x00000000, 8),
+    (0x0A000000, 8),
+    (0x64400000, 10),
+    (0x7F000000, 8),
+    (0xA9FE0000, 16),
+    (0xAC100000, 12),
+    (0xC0000000, 24),
+    (0xC0000200, 24),
+    (0xC0A80000, 16),
+    (0xC6120000, 15),
+    (0xC6336400, 24),
+    (0xCB007100, 24),
+    (0xE0000000, 3),
+)
+
+
+class Population:
+    def __init__(
+        self,
+        pool: ValuePool,
+        rng: np.random.Generator,
+        size: int = 10000,
+        activity: str = "zipf",
+        exponent: float = 1.0,
+    ):
+        """Simulated clients making the requests in the logs.
+
+        Each client is a row across compact array columns: a public IPv4
+        address and indexes into the pool's user agents, user names and
+        locations. Lines pick a client by its activity, so the number of
+        distinct clients is set by `size` rather than the generation speed.
+
+        Args:
+            pool (ValuePool): Pool of client attributes to assign from.
+            rng (np.random.Generator): Random generator to create clients with.
+            size (int, optional): Number of clients. Defaults to 10000.
+            activity (str, optional): "zipf" for a few very busy clients and a
+            long tail, or "uniform". Defaults to "zipf".
+            exponent (float, optional): Zipf exponent, higher makes the busiest
+            clients busier. Defaults to 1.0.
+        """
+        self.pool = pool
+        self.size = size
+        self.ip_address = self._addresses(rng, size)
+        self.attributes = {
+            field: rng.integers(0, pool.size, size, dtype=np.int32)
+            for field in CLIENT_FIELDS
+        }
+
+        if activity == "zipf":
+            weights = 1 / np.arange(1, size + 1, dtype=np.float64) ** exponent
+        else:
+            weights = np.ones(size)
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+
+    @staticmethod
+    def _addresses(rng: np.random.Generator, size: int) -> np.ndarray:
+        addresses = np.empty(0, dtype=np.uint32)
+        while len(addresses) < size:
+            candidates = rng.integers(0, 2**32, size, dtype=np.uint32)
+            public = np.ones(size, dtype=bool)
+            for network, prefix in RESERVED_NETWORKS:
+                public &= (candidates >> (32 - prefix)) != (network >> (32 - prefix))
+            addresses = np.concatenate([addresses, candidates[public]])
+        return addresses[:size]
+
+    def sample(self, rng: np.random.Generator, n: int, fields: set) -> dict:
+        """Pick the client of each line in a block.
+
+        Args:
+            rng (np.random.Generator): Random generator to pick clients with.
+            n (int): Number of lines.
+            fields (set): Names of the client fields to return.
+
+        Returns:
+            dict: Field name to list of `n` client attributes.
+        """
+        clients = np.searchsorted(self.cdf, rng.random(n), side="right")
+        clients = np.minimum(clients, self.size - 1)
+
+        columns = {
+            field: self.pool[field][indexes[clients]].tolist()
+            for field, indexes in self.attributes.items()
+            if field in fields
+        }
+        if "ip_address" not in fields:
+            return columns
+
+        # Only the distinct clients in the block need their address formatted
+        unique, inverse = np.unique(clients, return_inverse=True)
+        octets = [
+            (self.ip_address[unique] >> shift & 0xFF).tolist()
+            for shift in (24, 16, 8, 0)
+        ]
+        addresses = np.array(
+            [f"{a}.{b}.{c}.{d}" for a, b, c, d in zip(*octets)], dtype=object
+        )
+        columns["ip_address"] = addresses[inverse].tolist()
+        return columns
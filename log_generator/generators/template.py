@@ -0,0 +1,90 @@
+from string import Formatter
+
+# Fields a log format can refer to
+FIELDS = (
+    "host",
+    "http_method",
+    "http_protocol",
+    "http_status",
+    "ip_address",
+    "loc",
+    "referer",
+    "request_time",
+    "timestamp",
+    "transfer_size",
+    "uri_path",
+    "uri_query_params",
+    "user_agent",
+    "user_name",
+    "uuid",
+)
+
+# Named filters applied to a field with {field:filter}
+FILTERS = {
+    "number": lambda value: "0" if value == "-" else value,
+    "lower": lambda value: str(value).lower(),
+    "upper": lambda value: str(value).upper(),
+}
+
+
+class Template:
+    def __init__(self, spec: str):
+        """Log line format compiled into static text and field slots.
+
+        The spec uses str.format syntax, e.g. `{ip_address} - [{timestamp:%d/%b/%Y}]`.
+        The format spec of `timestamp` is a strftime format, any other field
+        can take the name of one of the FILTERS. Literal braces are doubled.
+
+        Everything static is folded into a single printf-style pattern once,
+        so rendering only has to fill in the field slots of each line.
+
+        Args:
+            spec (str): Log line format.
+
+        Raises:
+            ValueError: If the spec refers to an unknown field or filter.
+        """
+        fragments = []
+        self.slots = []
+        for literal, field, format_spec, conversion in Formatter().parse(spec):
+            fragments.append(literal.replace("%", "%%"))
+            if field is None:
+                continue
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field '{field}' in log format.")
+            if conversion or (
+                field != "timestamp" and format_spec and format_spec not in FILTERS
+            ):
+                raise ValueError(f"Unknown filter on '{field}' in log format.")
+            fragments.append("%s")
+            self.slots.append((field, format_spec))
+        self.pattern = "".join(fragments) + "\n"
+
+    def _column(self, values: list, field: str, format_spec: str) -> list:
+        if field == "timestamp":
+            return values.strftime(format_spec or "%Y-%m-%d %H:%M:%S")
+        if format_spec:
+            return list(map(FILTERS[format_spec], values))
+        return values
+
+    def render(self, columns: dict, n: int) -> str:
+        """Render a block of log lines.
+
+        Args:
+            columns (dict): Field name to list of values, `n` rows long, with
+            the timestamp field as generators.clock.Timestamps.
+            n (int): Number of rows in the block.
+
+        Returns:
+            str: The log lines, newline terminated and joined into one string.
+        """
+        if not self.slots:
+            # The pattern is still escaped, so fill it in with no values
+            return (self.pattern % ()) * n
+
+        # Fields used more than once in a format are only prepared once
+        prepared = {
+            slot: self._column(columns[slot[0]], *slot) for slot in set(self.slots)
+        }
+        rows = zip(*[prepared[slot] for slot in self.slots])
+        return "".join(map(self.pattern.__mod__, rows))
@@ -0,0 +1,64 @@
+import sys
+from importlib import import_module
+from importlib.metadata import entry_points
+
+
+class Registry:
+    def __init__(self, group: str, builtin: dict):
+        """Classes looked up by name and only imported when first used.
+
+        Built in classes are given as `module:Class` paths, other packages can
+        add their own through the `group` entry point group. Entry points are
+        only searched for names that aren't built in.
+
+        Args:
+            group (str): Entry point group to find more classes in.
+            builtin (dict): Name to `module:Class` path of the built in classes.
+        """
+        self.group = group
+        self.builtin = builtin
+        self.loaded = {}
+
+    def _entry_points(self) -> dict:
+        # The selectable entry points API is only in Python 3.10 and newer
+        if sys.version_info >= (3, 10):
+            found = entry_points(group=self.group)
+        else:
+            found = entry_points().get(self.group, [])
+        return {entry_point.name: entry_point for entry_point in found}
+
+    def names(self) -> list:
+        """Names of every class, built in ones first."""
+        plugins = [name for name in self._entry_points() if name not in self.builtin]
+        return list(self.builtin) + sorted(plugins)
+
+    def resolve(self, name: str) -> str:
+        """Registered name matching `name` in any case.
+
+        Raises:
+            KeyError: If nothing is registered under the name.
+        """
+        if name in self.builtin:
+            return name
+        for registered in self.builtin:
+            if registered.lower() == name.lower():
+                return registered
+        for registered in self._entry_points():
+            if registered.lower() == name.lower():
+                return registered
+        raise KeyError(name)
+
+    def load(self, name: str) -> type:
+        """Import and return the class registered under `name`.
+
+        Raises:
+            KeyError: If nothing is registered under the name.
+        """
+        name = self.resolve(name)
+        if name not in self.loaded:
+            if name in self.builtin:
+                module, _, attribute = self.builtin[name].partition(":")
+                self.loaded[name] = getattr(import_module(module), attribute)
+            else:
+                self.loaded[name] = self._entry_points()[name].load()
+        return self.loaded[name]
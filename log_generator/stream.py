@@ -3,10 +3,11 @@
 import sys
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Iterable, List, Optional
 
 import streams as ImplementedSinks
 import typer
+from streams.sources import GeneratorSource, read_lines
 
 
 class AvailableKafkaProducers(str, Enum):
@@ -15,6 +16,16 @@ class AvailableKafkaProducers(str, Enum):
     kafka_confluent_mp = "kafka-confluent-multiprocessing"
 
 
+class KinesisAggregation(Enum):
+    kpl = "kpl"
+    lines = "lines"
+
+
+class HTTPFormats(Enum):
+    ndjson = "ndjson"
+    lines = "lines"
+
+
 class FilesCompressors(Enum):
     bzip = "bzip"
     gzip = "gzip"
@@ -24,40 +35,115 @@ class FilesCompressors(Enum):
 
 app = typer.Typer(add_completion=False)
 
+# Input and rate limit options shared by every sink command
+INPUTFILE = typer.Argument(
+    sys.stdin.buffer,
+    show_default=False,
+    help="Path to textfile to stream, defaults to stdin pipe if none given.",
+)
+BINARY = typer.Option(
+    True,
+    "--binary/--text",
+    help="Pass lines to the sink as raw bytes, or decode them to text first.",
+)
+LINES = typer.Option(
+    None,
+    "--lines",
+    help="Only stream the lines START:END of a cached corpus input.",
+)
+SHARD = typer.Option(
+    None,
+    "--shard",
+    help="Only stream shard I/N of a cached corpus input, e.g. 0/4.",
+)
+GENERATE = typer.Option(
+    None,
+    "-g",
+    "--generate",
+    help="Stream from an in-process generator instead of the input, "
+    "e.g. 'apache,iterations=1000000,seed=42'.",
+)
+RATE = typer.Option(None, "-r", "--rate", help="Rate-limit line generation per second.")
+SCHEDULE = typer.Option(
+    None, "-s", "--schedule", help="Path to json file to schedule rate limits."
+)
+BURST = typer.Option(
+    None,
+    "--burst",
+    help="Most lines to send at once when catching up with the rate limit.",
+)
+POSITION = typer.Option(
+    0,
+    "-p",
+    "--position",
+    help="Position for progress bar, use 1 if you're piping from generate.",
+)
+
+
+def _lines(
+    inputfile: BinaryIO,
+    generate: Optional[str],
+    binary: bool,
+    lines: Optional[str] = None,
+    shard: Optional[str] = None,
+) -> Iterable:
+    """Lines to stream, from the input or a generator spec if one is given."""
+    if generate:
+        try:
+            return GeneratorSource(generate, binary=binary)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--generate")
+    if not (lines or shard):
+        return read_lines(inputfile, binary)
+
+    # Slicing a cached corpus uses its index rather than scanning the input
+    from corpus import Corpus
+
+    try:
+        corpus = Corpus(inputfile.name)
+    except (FileNotFoundError, ValueError):
+        raise typer.BadParameter(
+            "The input has to be a corpus cached by generate --cache-dir.",
+            param_hint="--lines/--shard",
+        )
+    try:
+        start, _, end = (lines or ":").partition(":")
+        index, _, count = (shard or "0/1").partition("/")
+        first, last = corpus.shard(
+            int(start or 0), int(end) if end else len(corpus), int(index), int(count)
+        )
+    except ValueError:
+        raise typer.BadParameter(
+            "Expected --lines START:END and --shard I/N.", param_hint="--lines/--shard"
+        )
+    return corpus.lines(first, last, binary)
+
 
 @app.command("stdout")
 def stdout_sink(
-    inputfile: Optional[typer.FileText] = typer.Argument(
-        sys.stdin,
-        show_default=False,
-        help="Path to textfile to stream, defaults to stdin pipe if none given.",
-    ),
-    rate: Optional[int] = typer.Option(
-        None, "-r", "--rate", help="Rate-limit line generation per second."
-    ),
-    schedule: Optional[typer.FileText] = typer.Option(
-        None, "-s", "--schedule", help="Path to json file to schedule rate limits."
-    ),
-    position: Optional[int] = typer.Option(
-        0,
-        "-p",
-        "--position",
-        help="Position for progress bar, use 1 if you're piping from generate.",
-    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
 ):
     # Set the progress bar position based on if the input is stdin
-    with ImplementedSinks.Stdout(rate=rate, schedule=schedule) as sink:
-        sink.iterate(inputfile, position)
+    with ImplementedSinks.Stdout(rate=rate, schedule=schedule, burst=burst) as sink:
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
 
 
 @app.command("kafka")
 def kafka_sinks(
     ctx: typer.Context,
-    inputfile: Optional[typer.FileText] = typer.Argument(
-        sys.stdin,
-        show_default=False,
-        help="Path to textfile to stream, defaults to stdin pipe if none given.",
-    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
     broker: List[str] = typer.Option(
         ...,
         help="Kafka broker to connect to. Can be used multiple times.",
@@ -70,18 +156,10 @@ def kafka_sinks(
         case_sensitive=False,
         help="Kafka producer implementation to use.",
     ),
-    rate: Optional[int] = typer.Option(
-        None, "-r", "--rate", help="Rate-limit line generation per second."
-    ),
-    schedule: Optional[typer.FileText] = typer.Option(
-        None, "-s", "--schedule", help="Path to json file to schedule rate limits."
-    ),
-    position: Optional[int] = typer.Option(
-        0,
-        "-p",
-        "--position",
-        help="Position for progress bar, use 1 if you're piping from generate.",
-    ),
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
     extra_config: Optional[List[str]] = typer.Option(
         None,
         "-e",
@@ -90,68 +168,106 @@ def kafka_sinks(
     ),
     sasl_username: Optional[str] = typer.Option(None, envvar="SASL_USERNAME"),
     sasl_password: Optional[str] = typer.Option(None, envvar="SASL_PASSWORD"),
+    workers: Optional[int] = typer.Option(
+        None,
+        "-w",
+        "--workers",
+        help="Producer processes of the multiprocessing producer, "
+        "defaults to one per core.",
+    ),
+    stats_interval: float = typer.Option(
+        10,
+        "--stats-interval",
+        help="Seconds between delivery summaries, 0 for only the final one.",
+    ),
+    key: Optional[str] = typer.Option(
+        None,
+        "-k",
+        "--key",
+        help="Message key of each line: apache, cloudfront or cloudflare for "
+        "the client IP, random, uuid, or regex:PATTERN. Defaults to no key.",
+    ),
 ):
     # Strip the key/value pairs from the extra config into a dict for config
     extra_config = dict(x.split("=") for x in extra_config) if extra_config else {}
 
-    if producer == AvailableKafkaProducers.kafka_confluent:
-        sink = ImplementedSinks.ConfluentKafka(
-            rate=rate,
-            schedule=schedule,
-            broker=broker,
-            topic=topic,
-            sasl_username=sasl_username,
-            sasl_password=sasl_password,
-            **extra_config,
-        )
-    if producer == AvailableKafkaProducers.kafka_confluent_mp:
-        sink = ImplementedSinks.ConfluentKafkaMP(
-            rate=rate,
-            schedule=schedule,
-            broker=broker,
-            topic=topic,
-            sasl_username=sasl_username,
-            sasl_password=sasl_password,
-            **extra_config,
-        )
-    if producer == AvailableKafkaProducers.kafka_python:
-        sink = ImplementedSinks.Kafka(
-            rate=rate,
-            schedule=schedule,
-            broker=broker,
-            topic=topic,
-            sasl_username=sasl_username,
-            sasl_password=sasl_password,
-            **extra_config,
-        )
-
-    sink.iterate(inputfile, position)
+    try:
+        if producer == AvailableKafkaProducers.kafka_confluent:
+            sink = ImplementedSinks.ConfluentKafka(
+                rate=rate,
+                schedule=schedule,
+                burst=burst,
+                broker=broker,
+                topic=topic,
+                sasl_username=sasl_username,
+                sasl_password=sasl_password,
+                stats_interval=stats_interval,
+                key=key,
+                **extra_config,
+            )
+        if producer == AvailableKafkaProducers.kafka_confluent_mp:
+            sink = ImplementedSinks.ConfluentKafkaMP(
+                rate=rate,
+                schedule=schedule,
+                burst=burst,
+                broker=broker,
+                topic=topic,
+                sasl_username=sasl_username,
+                sasl_password=sasl_password,
+                workers=workers,
+                stats_interval=stats_interval,
+                key=key,
+                **extra_config,
+            )
+        if producer == AvailableKafkaProducers.kafka_python:
+            sink = ImplementedSinks.Kafka(
+                rate=rate,
+                schedule=schedule,
+                burst=burst,
+                broker=broker,
+                topic=topic,
+                sasl_username=sasl_username,
+                sasl_password=sasl_password,
+                stats_interval=stats_interval,
+                key=key,
+                **extra_config,
+            )
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--key")
+    sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
     sink.close()
 
 
 @app.command("s3")
 def s3_sink(
-    inputfile: Optional[typer.FileText] = typer.Argument(
-        sys.stdin,
-        show_default=False,
-        help="Path to textfile to stream, defaults to stdin pipe if none given.",
-    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
     bucket: str = typer.Option(..., help="The S3 bucket to write to."),
     prefix: str = typer.Option(..., help="Prefix for the S3 key."),
-    rate: Optional[int] = typer.Option(
-        None, "-r", "--rate", help="Rate-limit line generation per second."
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
+    key_line_count: Optional[int] = typer.Option(
+        1000, "-c", "--linecount", help="Max line count size per S3 key."
     ),
-    schedule: Optional[typer.FileText] = typer.Option(
-        None, "-s", "--schedule", help="Path to json file to schedule rate limits."
+    compressed: bool = typer.Option(
+        False, "-z", "--compressed", help="Gzip the objects."
     ),
-    position: Optional[int] = typer.Option(
-        0,
-        "-p",
-        "--position",
-        help="Position for progress bar, use 1 if you're piping from generate.",
+    endpoint_url: Optional[str] = typer.Option(
+        None, "--endpoint-url", help="S3 compatible endpoint to use instead of AWS."
     ),
-    key_line_count: Optional[int] = typer.Option(
-        1000, "-c", "--linecount", help="Max line count size per S3 key."
+    part_size: int = typer.Option(
+        8, "--part-size", help="MiB per multipart upload part, at least 5."
+    ),
+    workers: int = typer.Option(8, "-w", "--workers", help="Parts uploaded at once."),
+    max_inflight: Optional[int] = typer.Option(
+        None,
+        "--max-inflight",
+        help="Most MiB waiting on uploads, defaults to two parts per worker.",
     ),
 ):
     # Set the progress bar position based on if the input is stdin
@@ -160,77 +276,237 @@ def s3_sink(
         prefix=prefix,
         rate=rate,
         schedule=schedule,
+        burst=burst,
         key_line_count=key_line_count,
+        compressed=compressed,
+        endpoint_url=endpoint_url,
+        part_size=part_size * 2**20,
+        workers=workers,
+        max_inflight=max_inflight * 2**20 if max_inflight else None,
     ) as sink:
-        sink.iterate(inputfile, position)
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
 
 
 @app.command("kinesis")
 def kinesis_sink(
-    inputfile: Optional[typer.FileText] = typer.Argument(
-        sys.stdin,
-        show_default=False,
-        help="Path to textfile to stream, defaults to stdin pipe if none given.",
-    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
     stream: str = typer.Option(..., help="Kinesis stream name to send to."),
-    rate: Optional[int] = typer.Option(
-        None, "-r", "--rate", help="Rate-limit line generation per second."
+    key: str = typer.Option(
+        "random",
+        "-k",
+        "--key",
+        help="Partition key of each line: apache, cloudfront or cloudflare for "
+        "the client IP, random, uuid, or regex:PATTERN.",
     ),
-    schedule: Optional[typer.FileText] = typer.Option(
-        None, "-s", "--schedule", help="Path to json file to schedule rate limits."
+    workers: int = typer.Option(
+        4, "-w", "--workers", help="PutRecords requests sent at once."
     ),
-    position: Optional[int] = typer.Option(
-        0,
-        "-p",
-        "--position",
-        help="Position for progress bar, use 1 if you're piping from generate.",
+    endpoint_url: Optional[str] = typer.Option(
+        None, "--endpoint-url", help="Kinesis compatible endpoint to use instead."
     ),
+    aggregate: Optional[KinesisAggregation] = typer.Option(
+        None,
+        "-a",
+        "--aggregate",
+        help="Pack many lines into each record, in the KPL aggregated format "
+        "or one after the other.",
+    ),
+    max_buffered_time: float = typer.Option(
+        1,
+        "--max-buffered-time",
+        help="Most seconds a line waits in a partly filled record or request, "
+        "0 to only send full ones.",
+    ),
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
 ):
     # Set the progress bar position based on if the input is stdin
-    with ImplementedSinks.Kinesis(
-        stream=stream,
+    try:
+        sink = ImplementedSinks.Kinesis(
+            stream=stream,
+            rate=rate,
+            schedule=schedule,
+            burst=burst,
+            key=key,
+            workers=workers,
+            endpoint_url=endpoint_url,
+            aggregate=aggregate.value if aggregate else None,
+            max_buffered_time=max_buffered_time,
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--key")
+    with sink:
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
+
+
+@app.command("http")
+def http_sink(
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
+    url: str = typer.Option(..., help="URL of the endpoint to POST lines to."),
+    body_format: HTTPFormats = typer.Option(
+        HTTPFormats.ndjson,
+        "-f",
+        "--format",
+        help="Send lines as JSON objects, wrapping ones that aren't as "
+        '{"message": line}, or as they are.',
+    ),
+    batch_size: int = typer.Option(
+        1000, "-b", "--batch-size", help="Most lines in a request."
+    ),
+    max_body: int = typer.Option(
+        1024, "--max-body", help="Most KiB of lines in a request, before gzip."
+    ),
+    compressed: bool = typer.Option(
+        False, "-z", "--compressed", help="Gzip the request bodies."
+    ),
+    level: int = typer.Option(6, "--level", help="Gzip compression level."),
+    concurrency: int = typer.Option(
+        8, "-c", "--concurrency", help="Requests in flight at once."
+    ),
+    timeout: float = typer.Option(
+        30, "--timeout", help="Seconds before a request is retried."
+    ),
+    header: Optional[List[str]] = typer.Option(
+        None,
+        "-H",
+        "--header",
+        help="'Name: value' header to send with every request. Can be used "
+        "multiple times.",
+    ),
+    stats_interval: float = typer.Option(
+        10,
+        "--stats-interval",
+        help="Seconds between delivery summaries, 0 for only the final one.",
+    ),
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
+):
+    headers = {}
+    for value in header or []:
+        name, _, value = value.partition(":")
+        if not (name.strip() and value.strip()):
+            raise typer.BadParameter(
+                "Expected headers as 'Name: value'.", param_hint="--header"
+            )
+        headers[name.strip()] = value.strip()
+
+    with ImplementedSinks.HTTP(
+        url=url,
         rate=rate,
         schedule=schedule,
+        burst=burst,
+        format=body_format.value,
+        batch_size=batch_size,
+        max_body=max_body * 2**10,
+        compressed=compressed,
+        level=level,
+        concurrency=concurrency,
+        timeout=timeout,
+        headers=headers,
+        stats_interval=stats_interval,
     ) as sink:
-        sink.iterate(inputfile, position)
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
 
 
 @app.command("filesystem")
 def files_sink(
-    inputfile: Optional[typer.FileText] = typer.Argument(
-        sys.stdin,
-        show_default=False,
-        help="Path to textfile to stream, defaults to stdin pipe if none given.",
-    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
     compressor: Optional[FilesCompressors] = typer.Option(
         None, "-z", "--compressor", help="Write compressed logs."
     ),
-    rate: Optional[int] = typer.Option(
-        None, "-r", "--rate", help="Rate-limit line generation per second."
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
+    path: Optional[Path] = typer.Option(Path("."), help="Where to write the files to."),
+    line_count: Optional[int] = typer.Option(
+        None,
+        "-c",
+        "--linecount",
+        help="Max line count size per file, 1000 unless another limit is set.",
     ),
-    schedule: Optional[typer.FileText] = typer.Option(
-        None, "-s", "--schedule", help="Path to json file to schedule rate limits."
+    max_bytes: Optional[int] = typer.Option(
+        None, "--max-bytes", help="Max uncompressed bytes per file."
     ),
-    position: Optional[int] = typer.Option(
-        0,
-        "-p",
-        "--position",
-        help="Position for progress bar, use 1 if you're piping from generate.",
+    interval: Optional[float] = typer.Option(
+        None, "--interval", help="Seconds before starting a new file."
     ),
-    path: Optional[Path] = typer.Option(Path("."), help="Where to write the files to."),
-    line_count: Optional[int] = typer.Option(
-        1000, "-c", "--linecount", help="Max line count size per file."
+    level: Optional[int] = typer.Option(
+        None, "--level", help="Compression level, defaults to the compressor's."
+    ),
+    threads: int = typer.Option(
+        0, "--threads", help="Threads zstd compresses each file with, -1 for all."
+    ),
+    workers: Optional[int] = typer.Option(
+        None,
+        "-w",
+        "--workers",
+        help="Files compressed in the background at once, defaults to one per core.",
     ),
 ):
     # Set the progress bar position based on if the input is stdin
     with ImplementedSinks.Files(
         rate=rate,
         schedule=schedule,
-        compressed=compressor,
+        burst=burst,
+        compressed=compressor.value if compressor else None,
         path=path,
         linecount=line_count,
+        max_bytes=max_bytes,
+        interval=interval,
+        level=level,
+        threads=threads,
+        workers=workers,
     ) as sink:
-        sink.iterate(inputfile, position)
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
+
+
+@app.command("plugin")
+def plugin_sink(
+    name: str = typer.Argument(
+        ..., help="Name of a sink registered under the log_generator.sinks group."
+    ),
+    inputfile: Optional[typer.FileBinaryRead] = INPUTFILE,
+    binary: bool = BINARY,
+    lines: Optional[str] = LINES,
+    shard: Optional[str] = SHARD,
+    generate: Optional[str] = GENERATE,
+    rate: Optional[int] = RATE,
+    schedule: Optional[typer.FileText] = SCHEDULE,
+    burst: Optional[int] = BURST,
+    position: Optional[int] = POSITION,
+    options: Optional[List[str]] = typer.Option(
+        None,
+        "-o",
+        "--option",
+        help="Key=Value pairs of options for the sink.",
+    ),
+):
+    # Strip the key/value pairs from the options into a dict for the sink
+    options = dict(x.split("=", 1) for x in options) if options else {}
+    try:
+        sink_class = ImplementedSinks.sinks.load(name)
+    except KeyError:
+        raise typer.BadParameter(f"Unknown sink '{name}'.", param_hint="name")
+
+    with sink_class(rate=rate, schedule=schedule, burst=burst, **options) as sink:
+        sink.iterate(_lines(inputfile, generate, binary, lines, shard), position)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,32 @@
 """Streaming output Sinks
 
-This module exposes sinks for the streaming utility to write to.
+This module exposes sinks for the streaming utility to write to. Each sink is
+only imported when it's first used, so a command doesn't pay for the client
+libraries of the others. Other packages can add sinks through the
+`log_generator.sinks` entry point group.
 """
 
-from streams.files import Files
-from streams.kafka_confluent import ConfluentKafka, ConfluentKafkaMP
-from streams.kafka_python import Kafka
-from streams.kinesis import Kinesis
-from streams.s3 import S3
-from streams.stdout import Stdout
+from registry import Registry
 
-__all__ = [Kafka, ConfluentKafka, ConfluentKafkaMP, S3, Kinesis, Files, Stdout]
+sinks = Registry(
+    "log_generator.sinks",
+    {
+        "Kafka": "streams.kafka_python:Kafka",
+        "ConfluentKafka": "streams.kafka_confluent:ConfluentKafka",
+        "ConfluentKafkaMP": "streams.kafka_confluent:ConfluentKafkaMP",
+        "S3": "streams.s3:S3",
+        "Kinesis": "streams.kinesis:Kinesis",
+        "Files": "streams.files:Files",
+        "HTTP": "streams.http:HTTP",
+        "Stdout": "streams.stdout:Stdout",
+    },
+)
+
+__all__ = list(sinks.builtin)
+
+
+def __getattr__(name: str):
+    try:
+        return sinks.load(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,186 @@
+"""Kinesis record aggregation.
+
+Packs many log lines into a single Kinesis record, as Kinesis throttles and
+bills shards per record. Two formats are supported:
+
+* `kpl`, the Kinesis Producer Library's aggregated record format, which the
+  Kinesis Client Library and Lambda de-aggregate transparently. It's the
+  magic bytes F3 89 9A C2, an AggregatedRecord protobuf message keeping the
+  partition key of each line, and the MD5 digest of that message.
+* `lines`, the lines as they are one after the other, for consumers that
+  split records on newlines themselves. Only the first line's key is kept.
+
+The protobuf message is simple enough to be written by hand here:
+
+    message AggregatedRecord {
+        repeated string partition_key_table = 1;
+        repeated string explicit_hash_key_table = 2;
+        repeated Record records = 3;
+    }
+    message Record {
+        required uint64 partition_key_index = 1;
+        optional uint64 explicit_hash_key_index = 2;
+        required bytes data = 3;
+    }
+"""
+
+from hashlib import md5
+from typing import List, Optional, Tuple
+
+MAGIC = b"\xf3\x89\x9a\xc2"
+FORMATS = ("kpl", "lines")
+# Most bytes in a Kinesis record, counting its partition key
+MAX_RECORD_BYTES = 2**20
+# Bytes a partition key can take in the outer record
+MAX_KEY_BYTES = 256
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _field(number: int, value: bytes) -> bytes:
+    """A length delimited protobuf field."""
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+class Aggregator:
+    def __init__(self, format: str = "kpl", limit: int = MAX_RECORD_BYTES):
+        """Lines packed into a single Kinesis record.
+
+        Args:
+            format (str, optional): One of FORMATS. Defaults to "kpl".
+            limit (int, optional): Most bytes in the record, with its key.
+            Defaults to the 1MB Kinesis limit.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown aggregation format '{format}'.")
+        self.format = format
+        self.limit = limit
+        self._reset()
+
+    def _reset(self):
+        self.key = None
+        self.keys = {}
+        self.tables = []
+        self.records = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _encode(self, key: bytes, data: bytes) -> Tuple[List[bytes], bytes]:
+        """Key table entry, if the key is new, and record of a line."""
+        if self.format == "lines":
+            return [], data
+        table = [] if key in self.keys else [_field(1, key)]
+        index = self.keys.get(key, len(self.keys))
+        return table, _field(3, b"\x08" + _varint(index) + _field(3, data))
+
+    def add(self, key: bytes, data: bytes) -> Optional[Tuple[bytes, bytes]]:
+        """Add a line, finishing the record first if the line won't fit.
+
+        Args:
+            key (bytes): Partition key of the line.
+            data (bytes): The line.
+
+        Returns:
+            Optional[Tuple[bytes, bytes]]: The finished partition key and
+            record data if the line didn't fit, else None.
+        """
+        finished = None
+        table, record = self._encode(key, data)
+        size = sum(map(len, table)) + len(record)
+        # The magic bytes and digest only count towards kpl records
+        overhead = len(MAGIC) + 16 if self.format == "kpl" else 0
+        if self.records and (
+            self.size + size + overhead + len(self.key[:MAX_KEY_BYTES]) > self.limit
+        ):
+            finished = self.finish()
+            table, record = self._encode(key, data)
+            size = sum(map(len, table)) + len(record)
+
+        if self.key is None:
+            self.key = key
+        if table:
+            self.keys[key] = len(self.keys)
+        self.tables.extend(table)
+        self.records.append(record)
+        self.size += size
+        return finished
+
+    def finish(self) -> Tuple[bytes, bytes]:
+        """The partition key and data of the record, starting a new one.
+
+        The record takes the partition key of its first line.
+        """
+        if self.format == "lines":
+            record = b"".join(self.records)
+        else:
+            message = b"".join(self.tables + self.records)
+            record = MAGIC + message + md5(message).digest()
+        key = self.key[:MAX_KEY_BYTES]
+        self._reset()
+        return key, record
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, position
+
+
+def _read_fields(data: bytes):
+    """Field numbers and values of a protobuf message."""
+    position = 0
+    while position < len(data):
+        tag, position = _read_varint(data, position)
+        if tag & 7 == 0:
+            value, position = _read_varint(data, position)
+        elif tag & 7 == 2:
+            length, position = _read_varint(data, position)
+            value, position = data[position : position + length], position + length
+        else:
+            raise ValueError(f"Unexpected protobuf wire type {tag & 7}.")
+        yield tag >> 3, value
+
+
+def deaggregate(key: bytes, data: bytes) -> List[Tuple[Optional[bytes], bytes]]:
+    """The lines of a record, with their partition keys.
+
+    Records that aren't in the kpl format are split on newlines, and their
+    lines are given the record's key.
+
+    Args:
+        key (bytes): Partition key of the record.
+        data (bytes): Data of the record.
+
+    Raises:
+        ValueError: If a kpl record's digest doesn't match.
+
+    Returns:
+        List[Tuple[Optional[bytes], bytes]]: Partition key and data of each line.
+    """
+    if not data.startswith(MAGIC):
+        return [(key, line) for line in data.splitlines(keepends=True)]
+    message, digest = data[len(MAGIC) : -16], data[-16:]
+    if md5(message).digest() != digest:
+        raise ValueError("Aggregated record digest doesn't match.")
+    keys, lines = [], []
+    for number, value in _read_fields(message):
+        if number == 1:
+            keys.append(value)
+        elif number == 3:
+            fields = dict(_read_fields(value))
+            lines.append((fields[1], fields[3]))
+    return [(keys[index], line) for index, line in lines]
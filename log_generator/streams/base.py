@@ -1,64 +1,253 @@
-import functools as _functools
+import bz2
+import gzip
 import json
+import lzma
+import random
 import sys
-import threading as _threading
+import threading
 import time
-from bz2 import BZ2File
-from gzip import GzipFile
-from io import BytesIO
-from itertools import cycle
-from lzma import LZMAFile
+from itertools import islice
 from sys import exit
-from typing import Callable, TextIO
-
-from cachetools import TTLCache, cached
+from typing import AnyStr, BinaryIO, Callable, Iterable, Iterator
 
 # Remove standard handler and write loguru lines via tqdm.write
 from loguru import logger
 from tqdm import tqdm
-from zstandard import FLUSH_FRAME, ZstdCompressor
 
 logger.remove()
 logger.add(lambda msg: tqdm.write(msg, end="", file=sys.stderr))
 
+# Most lines read from the input and handed to a sink at a time
+BATCH_SIZE = 1000
+
+# File suffix and default level of each compression method
+SUFFIXES = {
+    "zstd": ".log.zstd",
+    "gzip": ".log.gz",
+    "bzip": ".log.bz2",
+    "lzma": ".log.xz",
+}
+LEVELS = {"zstd": 12, "gzip": 9, "bzip": 9, "lzma": 6}
+
+
+def compress(data: bytes, method: str = "gzip", level: int = None, threads: int = 0):
+    """Compress a block of log lines.
+
+    The compressors release the GIL, so blocks can be compressed on threads
+    while the sink carries on streaming.
+
+    Args:
+        data (bytes): Log lines to compress.
+        method (str, optional): One of SUFFIXES. Defaults to "gzip".
+        level (int, optional): Compression level. Defaults to LEVELS.
+        threads (int, optional): Threads zstd compresses with, -1 for one per
+        core. Defaults to 0, compressing on the calling thread.
+
+    Returns:
+        bytes: The compressed data.
+    """
+    level = LEVELS[method] if level is None else level
+    if method == "zstd":
+        from zstandard import ZstdCompressor
+
+        return ZstdCompressor(level=level, threads=threads).compress(data)
+    if method == "gzip":
+        return gzip.compress(data, compresslevel=level)
+    if method == "bzip":
+        return bz2.compress(data, compresslevel=level)
+    if method == "lzma":
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Unknown compression method '{method}'.")
 
-def rate_limited(max_per_second: int) -> Callable:
-    """Rate limiting decorator.
+
+def compressor(
+    file: BinaryIO, method: str = "gzip", level: int = None, threads: int = 0
+) -> BinaryIO:
+    """Writer compressing into an open file as it's written to.
+
+    Closing the writer finishes the compressed stream but leaves `file` open.
 
     Args:
-        max_per_second (int): Rate the decorated function can execute.
+        file (BinaryIO): File opened for writing in binary mode.
+        method (str, optional): One of SUFFIXES. Defaults to "gzip".
+        level (int, optional): Compression level. Defaults to LEVELS.
+        threads (int, optional): Threads zstd compresses with, -1 for one per
+        core. Defaults to 0, compressing on the calling thread.
 
     Returns:
-        Callable: Decorated function.
+        BinaryIO: Writer for the uncompressed data.
+    """
+    level = LEVELS[method] if level is None else level
+    if method == "zstd":
+        from zstandard import ZstdCompressor
+
+        cctx = ZstdCompressor(level=level, threads=threads)
+        return cctx.stream_writer(file, closefd=False)
+    if method == "gzip":
+        return gzip.GzipFile(None, "wb", compresslevel=level, fileobj=file)
+    if method == "bzip":
+        return bz2.BZ2File(file, "wb", compresslevel=level)
+    if method == "lzma":
+        return lzma.LZMAFile(file, "wb", preset=level)
+    raise ValueError(f"Unknown compression method '{method}'.")
+
+
+class RateLimiter:
+    # Waits shorter than this are spun out rather than slept, as sleep can
+    # overshoot by around a millisecond
+    SPIN = 0.002
+    # How long to wait before checking again while the rate is zero
+    PAUSE = 0.05
+
+    def __init__(
+        self,
+        rate: Callable[[float], float],
+        burst: float = None,
+        duration: float = None,
+    ):
+        """Token bucket admitting lines at a target rate.
+
+        Tokens accrue at the current rate up to the burst size, and lines are
+        admitted by taking tokens, waiting for them if there aren't enough.
+        The bucket keeps its state between calls, so the rate holds however
+        the lines are admitted, one at a time or in whole blocks.
+
+        Args:
+            rate (Callable[[float], float]): Target lines per second, given the
+            seconds since the first line was admitted.
+            burst (float, optional): Most lines admitted at once after a pause.
+            Defaults to 10ms of lines at the current rate.
+            duration (float, optional): Seconds after which no more lines are
+            admitted. Defaults to None, for no end.
+        """
+        self.rate_at = rate
+        self.burst = burst
+        self.duration = duration
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.started = None
+        self.last = None
+        # Lines admitted, and lines the target rate allowed for, since started
+        self.admitted = 0
+        self.target = 0.0
+
+    @property
+    def done(self) -> bool:
+        """Whether the duration is up."""
+        return (
+            self.duration is not None
+            and self.started is not None
+            and self.last - self.started >= self.duration
+        )
+
+    def _refill(self):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = self.last = now
+        self.rate = self.rate_at(now - self.started)
+        accrued = (now - self.last) * self.rate
+        self.target += accrued
+        self.tokens = min(self.tokens + accrued, self.capacity())
+        self.last = now
+
+    def capacity(self) -> float:
+        """Most lines admitted at once at the current rate."""
+        return self.burst or max(1.0, self.rate / 100)
+
+    def _wait(self, seconds: float):
+        deadline = time.perf_counter() + seconds
+        if seconds > self.SPIN:
+            time.sleep(seconds - self.SPIN)
+        while time.perf_counter() < deadline:
+            pass
+
+    def acquire(self, lines: int = 1) -> int:
+        """Wait until `lines` lines can be sent.
+
+        Blocks larger than the burst size are admitted a burst at a time.
+
+        Args:
+            lines (int, optional): Number of lines to admit. Defaults to 1.
+
+        Returns:
+            int: Lines admitted, fewer than asked for if the duration ran out.
+        """
+        admitted = 0
+        while admitted < lines:
+            self._refill()
+            take = min(lines - admitted, self.capacity())
+            # The tokens are taken up front and the debt waited off, so time
+            # slept past it carries over to the next lines instead of being
+            # capped away with a full bucket
+            self.tokens -= take
+            while self.tokens < 0:
+                if self.done:
+                    self.tokens += take
+                    return int(admitted)
+                if self.rate > 0:
+                    self._wait(-self.tokens / self.rate)
+                else:
+                    time.sleep(self.PAUSE)
+                self._refill()
+            self.admitted += take
+            admitted += take
+        return lines
+
+    def report(self) -> str:
+        """Achieved rate against the target rate since the first line."""
+        elapsed = (self.last or 0) - (self.started or 0)
+        if not elapsed or not self.target:
+            return f"Sent {self.admitted:,.0f} lines."
+        return (
+            f"Sent {self.admitted:,.0f} lines in {elapsed:,.1f}s at "
+            f"{self.admitted / elapsed:,.0f} lines/s, against a target of "
+            f"{self.target / elapsed:,.0f} lines/s "
+            f"({(self.admitted - self.target) / self.target:+.2%})."
+        )
+
+
+def backoff(attempt: int, base: float = 0.1, cap: float = 10.0) -> float:
+    """Seconds to wait before retrying, exponential with full jitter.
+
+    Args:
+        attempt (int): Retries made so far, starting at 0.
+        base (float, optional): Most seconds to wait on the first retry.
+        cap (float, optional): Most seconds to ever wait.
     """
-    lock = _threading.Lock()
-    min_interval = 1.0 / max_per_second
+    return random.uniform(0, min(cap, base * 2**attempt))
 
-    def decorate(func):
-        last_time_called = time.perf_counter()
 
-        @_functools.wraps(func)
-        def rate_limited_function(*args, **kwargs):
-            lock.acquire()
-            nonlocal last_time_called
-            try:
-                elapsed = time.perf_counter() - last_time_called
-                left_to_wait = min_interval - elapsed
-                if left_to_wait > 0:
-                    time.sleep(left_to_wait)
+class ByteBudget:
+    def __init__(self, limit: int):
+        """Limit on the bytes held by sends still in flight.
 
-                return func(*args, **kwargs)
-            finally:
-                last_time_called = time.perf_counter()
-                lock.release()
+        A single block larger than the limit is let through on its own, so
+        it can't wait forever.
 
-        return rate_limited_function
+        Args:
+            limit (int): Most bytes in flight at once.
+        """
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size: int):
+        """Wait until `size` more bytes fit in the budget and take them."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.used == 0 or self.used + size <= self.limit
+            )
+            self.used += size
 
-    return decorate
+    def release(self, size: int):
+        """Give back bytes that are no longer in flight."""
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
 
 
 class Output:
-    def __init__(self, rate: int = None, schedule: dict = None):
+    def __init__(self, rate: int = None, schedule: dict = None, burst: int = None):
         """Base class for all output sinks.
 
         Handles rate limiting and sending to child classes via the proxy of
@@ -69,86 +258,115 @@ class Output:
             rate (int, optional): Rate limiter per second. Defaults to None.
             schedule (dict, optional): Dictionary of scheduled rate limits.
             Defaults to None.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
         """
-        self._reset()
+        self.buffer = []
         self.rate = rate
+        self.limiter = None
 
         if schedule:
             self._parse_schedule(schedule)
-            self.rate_set = cycle(self.raw_rate)
-            self.ttlcache = TTLCache(1, ttl=self.ttl)
+            self.limiter = RateLimiter(
+                self._rate_polling,
+                burst,
+                None if self.timeline.repeat else self.timeline.duration,
+            )
+        elif rate:
+            self.limiter = RateLimiter(self._rate_polling, burst)
 
     def _parse_schedule(self, schedule: dict):
-        """Parses schedule json into interval and rates.
+        """Parses schedule json into a timeline of rates.
 
         Args:
             schedule (dict): JSON deserialised for scheduling.
         """
+        from streams.schedule import Timeline
+
         try:
-            x = json.load(schedule)
-            self.raw_rate = x["schedule"]
-            self.ttl = x["update_interval"]
-        except KeyError:
-            print("ERROR: Missing value in json file")
+            self.timeline = Timeline(json.load(schedule))
+        except KeyError as e:
+            print(f"ERROR: Missing value {e} in json file")
             exit(1)
         except json.decoder.JSONDecodeError:
             print("ERROR: json is malformed")
             exit(2)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(3)
 
-    def _rate_polling(self) -> int:
-        """Rate limiting the send method.
+    def _rate_polling(self, elapsed: float) -> float:
+        """Rate limit at a point in the stream.
+
+        Args:
+            elapsed (float): Seconds since the first line was sent.
 
         Returns:
-            int: Log lines per second
+            float: Log lines per second
         """
         if self.rate:
             return self.rate
-        else:
+        return self.timeline.rate_at(elapsed)
 
-            @cached(cache=self.ttlcache)
-            def subfunction(self):
-                return next(self.rate_set)
+    def _send(self, logline: AnyStr):
+        raise NotImplementedError
 
-            return subfunction(self)
+    def _send_batch(self, loglines: list):
+        """Send a block of log lines, sinks override this to send them in bulk.
 
-    def _send(self, logline: str):
-        raise NotImplementedError
+        Args:
+            loglines (list): Log lines as bytes or str.
+        """
+        for logline in loglines:
+            self._send(logline)
 
-    def _compress(self, method: str = "gzip"):
-        def bytes_buffer():
-            return "".join(self.buffer).encode("UTF-8")
-
-        if method == "zstd":
-            cctx = ZstdCompressor(level=12)
-            compressed = cctx.stream_writer(self.body, closefd=False)
-            self.suffix = ".log.zstd"
-        elif method == "gzip":
-            compressed = GzipFile(None, "wb", compresslevel=9, fileobj=self.body)
-            self.suffix = ".log.gz"
-        elif method == "bzip":
-            compressed = BZ2File(self.body, "wb", compresslevel=9)
-            self.suffix = ".log.bz2"
-        elif method == "lzma":
-            compressed = LZMAFile(self.body, "wb")
-            self.suffix = ".log.xz"
-
-        compressed.write(bytes_buffer())
-        compressed.flush()
-        compressed.close()
-
-    def _write(self):
-        self.body.write("".join(self.buffer).encode("utf-8"))
-
-    def _reset(self):
-        self.ttl = None
-        self.buffer = []
-        self.body = BytesIO()
+    @staticmethod
+    def _encode(logline: AnyStr) -> bytes:
+        return logline if isinstance(logline, bytes) else logline.encode("utf-8")
+
+    def _joined(self, loglines: list = None) -> bytes:
+        """Log lines, bytes or str, as a single bytes string.
+
+        Args:
+            loglines (list, optional): Log lines to join. Defaults to the buffer.
+        """
+        loglines = self.buffer if loglines is None else loglines
+        if loglines and isinstance(loglines[0], str):
+            return "".join(loglines).encode("utf-8")
+        return b"".join(loglines)
 
-    def iterate(self, inputfile: TextIO, position: int):
-        [
-            self.send(line)
-            for line in tqdm(
-                inputfile,
+    def _drain(self, limit: int = 0):
+        """Collect the sends a sink has handed off to workers, oldest first.
+
+        Sinks sending in the background keep the futures of their sends in
+        `self.pending`. Those that have finished are collected, and the oldest
+        waited on until fewer than `limit` are left, so errors surface in the
+        streaming thread and the backlog stays bounded.
+
+        Args:
+            limit (int, optional): Most sends to leave pending. Defaults to 0,
+            waiting on all of them.
+        """
+        while self.pending and (self.pending[0].done() or len(self.pending) >= limit):
+            self.pending.popleft().result()
+
+    def _batches(self, inputfile: Iterable) -> Iterator[list]:
+        # Rate limited batches are kept to half a burst, so slow rates don't
+        # wait on the input for lines they can't send yet, and the time the
+        # sink takes over a batch still accrues towards the next one
+        lines = iter(inputfile)
+        while True:
+            size = BATCH_SIZE
+            if self.limiter:
+                size = min(size, max(1, int(self.limiter.capacity() / 2)))
+            batch = list(islice(lines, size))
+            if not batch:
+                return
+            yield batch
+
+    def iterate(self, inputfile: Iterable, position: int):
+        try:
+            with tqdm(
                 unit=" msgs",
                 desc="Streaming",
                 unit_scale=True,
@@ -156,20 +374,41 @@ class Output:
                 mininterval=0.5,
                 maxinterval=1,
                 disable=None,
-            )
-        ]
+            ) as progress:
+                for loglines in self._batches(inputfile):
+                    sent = self.send_batch(loglines)
+                    progress.update(sent)
+                    if sent < len(loglines):
+                        break
+        finally:
+            if self.limiter:
+                logger.info(self.limiter.report())
+
+    def send_batch(self, loglines: list) -> int:
+        """Send a block of log lines to the sink, within the rate limit.
 
-    def send(self, logline: str):
+        Args:
+            loglines (list): Log lines as bytes or str.
+
+        Returns:
+            int: Lines sent, fewer than given if a finite schedule ended.
+        """
+        if not self.limiter:
+            self._send_batch(loglines)
+            return len(loglines)
+
+        admitted = self.limiter.acquire(len(loglines))
+        if admitted:
+            self._send_batch(loglines[:admitted])
+        return admitted
+
+    def send(self, logline: AnyStr):
         """Sent log line to sink.
 
         Args:
-            logline (str): the logline to send.
+            logline (AnyStr): the logline to send, as bytes or str.
 
         Returns:
             None
         """
-        if self.rate or self.ttl:
-            func = rate_limited(self._rate_polling())(self._send)
-            func(logline)
-        else:
-            self._send(logline)
+        self.send_batch([logline])
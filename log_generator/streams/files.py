@@ -1,37 +1,76 @@
+import os
+import queue
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import accumulate
 from pathlib import Path
 
-from streams.base import Output
+from streams.base import SUFFIXES, Output, compressor
 
-from stream import FilesCompressors
+# Line count files are rotated at when no other limit is given
+LINECOUNT = 1000
+# Blocks of lines queued for each file before streaming waits on its worker
+QUEUED_BLOCKS = 16
 
 
 class Files(Output):
     def __init__(
         self,
-        compressed: FilesCompressors,
+        compressed: str,
         rate: int,
         schedule: dict,
         path: Path,
-        linecount: int,
+        linecount: int = None,
+        burst: int = None,
+        level: int = None,
+        threads: int = 0,
+        workers: int = None,
+        max_bytes: int = None,
+        interval: float = None,
     ):
         """Local Filesystem Sink.
 
-        Writes files locally with a given path (must already exist).
+        Writes files locally with a given path (must already exist). Each file
+        is compressed as it's streamed by a background worker, into a `.tmp`
+        file that's renamed into place once it's complete.
 
         Args:
             path (str, optional): Path to directory you want to stream to.
             Defaults to ".".
-            linecount (int, optional): Lines per file. Defaults to 1000.
-            compressor (FilesCompressors, optional): Optional Compressor.
+            linecount (int, optional): Lines per file. Defaults to 1000 if no
+            other limit is given.
+            compressor (str, optional): Name of an optional compressor.
             Defaults to False.
             rate (int, optional): [description]. Defaults to None.
+            level (int, optional): Compression level. Defaults to the
+            compressor's default in LEVELS.
+            threads (int, optional): Threads zstd compresses each file with,
+            -1 for one per core. Defaults to 0.
+            workers (int, optional): Files compressed and written in the
+            background at once. Defaults to one per core.
+            max_bytes (int, optional): Uncompressed bytes per file.
+            interval (float, optional): Seconds before starting a new file.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
         self.compressed = compressed
-        self.suffix = ".log"
+        self.suffix = SUFFIXES[compressed] if compressed else ".log"
+        if not (linecount or max_bytes or interval):
+            linecount = LINECOUNT
         self.buffer_size = linecount
+        self.max_bytes = max_bytes
+        self.interval = interval
         self.path = path
+        self.level = level
+        self.threads = threads
+        workers = workers or os.cpu_count()
+        self.workers = ThreadPoolExecutor(workers)
+        # Bounds how many rotated files are still waiting on a worker
+        self.pending = deque()
+        self.max_pending = 2 * workers
+        self.blocks = None
 
     def __enter__(self):
         return self
@@ -40,21 +79,84 @@ class Files(Output):
         self.close()
 
     def close(self):
-        if len(self.buffer) > 0:
-            now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-            self.write(f"{now}.log")
-
-    def _send(self, logline: str):
-        self.buffer.append(logline)
-        if len(self.buffer) >= self.buffer_size:
-            now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-            self.write(f"{now}.log")
-
-    def write(self, key: str):
-        if self.compressed:
-            self._compress(method=self.compressed.value)
-        else:
-            self._write()
-        with open(Path(self.path) / Path(key).with_suffix(self.suffix), "wb") as file:
-            file.write(self.body.getvalue())
-        self._reset()
+        self._rotate()
+        for future in self.pending:
+            future.result()
+        self.workers.shutdown()
+
+    def _write_file(self, path: Path, blocks: queue.Queue):
+        """Write blocks of lines to `path` until a None block, then rename."""
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "wb") as file:
+            writer = (
+                compressor(file, self.compressed, self.level, self.threads)
+                if self.compressed
+                else file
+            )
+            for block in iter(blocks.get, None):
+                writer.write(block)
+            if writer is not file:
+                writer.close()
+        os.replace(tmp, path)
+
+    def _open(self):
+        """Start a new file named after the current time."""
+        while len(self.pending) >= self.max_pending:
+            self.pending.popleft().result()
+        now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+        self.blocks = queue.Queue(QUEUED_BLOCKS)
+        self.pending.append(
+            self.workers.submit(
+                self._write_file, Path(self.path) / f"{now}{self.suffix}", self.blocks
+            )
+        )
+        self.opened = time.monotonic()
+        self.lines = 0
+        self.size = 0
+
+    def _rotate(self):
+        """Finish the open file, if there is one."""
+        if self.blocks is not None:
+            self._put(None)
+            self.blocks = None
+
+    def _put(self, block: bytes):
+        # Wait on the worker in short steps so a failed one is noticed
+        while True:
+            try:
+                return self.blocks.put(block, timeout=0.1)
+            except queue.Full:
+                if self.pending[-1].done():
+                    self.pending[-1].result()
+
+    def _fits(self, loglines: list) -> int:
+        """How many of the lines fit in the open file."""
+        fits = len(loglines)
+        if self.buffer_size:
+            fits = min(fits, self.buffer_size - self.lines)
+        if self.max_bytes:
+            sizes = accumulate(len(logline) for logline in loglines[:fits])
+            fits = min(fits, bisect_right(list(sizes), self.max_bytes - self.size))
+        # A line longer than max_bytes gets a file to itself
+        return fits or (1 if self.lines == 0 else 0)
+
+    def _send_batch(self, loglines: list):
+        if self.max_bytes:
+            # Files are limited in bytes, so text lines are measured encoded
+            loglines = list(map(self._encode, loglines))
+        while loglines:
+            if self.blocks is not None and (
+                self.interval and time.monotonic() - self.opened >= self.interval
+            ):
+                self._rotate()
+            if self.blocks is None:
+                self._open()
+            fits = self._fits(loglines)
+            if fits:
+                block = self._joined(loglines[:fits])
+                self._put(block)
+                self.lines += fits
+                self.size += len(block)
+                loglines = loglines[fits:]
+            if loglines:
+                self._rotate()
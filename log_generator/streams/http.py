@@ -1,39 +1,209 @@
-import httpx
-from streams.base import Output
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+import aiohttp
+from loguru import logger
+from streams.base import Output, backoff, compress
+from streams.metrics import DeliveryStats
+
+# Bodies the lines of a request can be sent as, and their content types
+FORMATS = {"ndjson": "application/x-ndjson", "lines": "text/plain"}
+# Attempts at each request before the stream is given up on
+ATTEMPTS = 5
+# Responses from a collector that's busy or briefly unavailable
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def _ndjson(line: bytes) -> bytes:
+    """A line as a JSON object, left as it is if it already is one."""
+    line = line.rstrip(b"\r\n")
+    if line.startswith(b"{"):
+        return line + b"\n"
+    return json.dumps({"message": line.decode("utf-8", "replace")}).encode() + b"\n"
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> float:
+    """Seconds a response asks to wait before retrying, 0 if it doesn't."""
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0
 
 
 class HTTP(Output):
-    def __init__(self, url: str, rate: int = 1, schedule: dict = None):
-        """Synchronous HTTP client for submitting logs.
+    def __init__(
+        self,
+        url: str,
+        rate: int = None,
+        schedule: dict = None,
+        burst: int = None,
+        format: str = "ndjson",
+        batch_size: int = 1000,
+        max_body: int = 2**20,
+        compressed: bool = False,
+        level: int = 6,
+        concurrency: int = 8,
+        timeout: float = 30,
+        headers: dict = None,
+        stats_interval: float = 10,
+    ):
+        """HTTP sink POSTing batches of lines with aiohttp.
+
+        Requests are made on an event loop running on a thread of its own,
+        over a pool of keep-alive connections, with up to `concurrency` of
+        them in flight at once. Streaming only waits on the collector when as
+        many batches again are waiting for a connection.
 
         Args:
-            url (str): URL of endpoint to POST to.
-            rate (int, optional): Submissions per second rate limiter. Defaults to 1.
+            url (str): URL of the endpoint to POST to.
+            rate (int, optional): Rate per second to send. Defaults to None.
+            schedule (dict, optional): Scheduled rate limits. Defaults to None.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
+            format (str, optional): Body of each request, one of FORMATS.
+            `ndjson` sends each line as a JSON object, wrapping lines that
+            aren't one as {"message": line}. `lines` sends them as they are.
+            Defaults to "ndjson".
+            batch_size (int, optional): Most lines in a request. Defaults to
+            1000.
+            max_body (int, optional): Most bytes of lines in a request, before
+            compression. Defaults to 1MiB.
+            compressed (bool, optional): Gzip the bodies. Defaults to False.
+            level (int, optional): Gzip level, favouring speed over size by
+            default. Defaults to 6.
+            concurrency (int, optional): Requests in flight at once, and
+            connections kept open. Defaults to 8.
+            timeout (float, optional): Seconds before a request is given up
+            on and retried. Defaults to 30.
+            headers (dict, optional): Extra headers sent with every request,
+            such as an authorization token. Defaults to None.
+            stats_interval (float, optional): Seconds between delivery
+            summaries, 0 for only the final one. Defaults to 10.
+
+        Raises:
+            ValueError: If the format isn't one of FORMATS.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
+        if format not in FORMATS:
+            raise ValueError(f"Unknown body format '{format}'.")
         self.url = url
-        self.client = httpx.Client(http2=True)
+        self.format = format
+        self.buffer_size = batch_size
+        self.max_body = max_body
+        self.compressed = compressed
+        self.level = level
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = {"Content-Type": FORMATS[format]}
+        if compressed:
+            self.headers["Content-Encoding"] = "gzip"
+        self.headers.update(headers or {})
+        self.stats = DeliveryStats("HTTP", stats_interval)
+        self.pending = deque()
+        self.max_pending = 2 * concurrency
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
 
     def __enter__(self):
+        self.buffer = []
+        self.size = 0
+        self.thread.start()
+        self._run(self._open()).result()
         return self
 
     def __exit__(self, type, value, traceback):
-        self.close()
-
-    def close(self):
-        self.client.close()
-
-    def send(self, logline: str):
-        data = {
-            "Request": logline,
-            "TimeLocal": "2020-09-25 16:30:00:00 +0000",
-            "RealIp": "1.1.1.1",
-            "UserAgent": "UserAgent Value",
-            "Status": "200",
-            "RequestTime": "9",
-            "BytesSent": "100",
-            "NetaceaUserIdCookie": "NzQ5NTkyMDBmNDc5NmJkYzcwZmQ5YzgxYzg4MjI3NTcwZWYwODVkYTc0NGI4YmM3MTFmNjE3YWQzM2UwZTgxMQ==_/@#/1596112893_/@#/m92recxp96jt0vfh_/@#/211;",
-            "NetaceaMitigationApplied": "ip_allow",
-            "Referer": "-",
-        }
-        response = self.client.post(self.url, data=data)
+        try:
+            if type is None:
+                if self.buffer:
+                    self.write()
+                self._drain()
+        finally:
+            # POSTs still waiting on a connection or a retry when something
+            # failed are cancelled, their lines go unsent
+            for request in self.pending:
+                request.cancel()
+            self._run(self.session.close()).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.stats.report(final=True)
+
+    def _run(self, coroutine):
+        """Run a coroutine on the sink's event loop, giving its future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _open(self):
+        # The session and semaphore belong to the loop they're made on
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+        self.slots = asyncio.Semaphore(self.concurrency)
+
+    async def _post(self, count: int, body: bytes):
+        """POST a body of `count` lines, retrying failures with backoff.
+
+        Raises:
+            RuntimeError: If the request still fails after every attempt, or
+            the collector rejects it outright.
+        """
+        if self.compressed:
+            # Gzip releases the GIL, so bodies compress alongside streaming
+            body = await self.loop.run_in_executor(
+                None, compress, body, "gzip", self.level
+            )
+        for attempt in range(ATTEMPTS):
+            wait = backoff(attempt)
+            async with self.slots:
+                started = time.monotonic()
+                try:
+                    async with self.session.post(self.url, data=body) as response:
+                        await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error, retry = repr(e), True
+                else:
+                    if response.status < 300:
+                        self.stats.ack(time.monotonic() - started, count)
+                        return
+                    error = f"{response.status} {response.reason}"
+                    retry = response.status in RETRY_STATUSES
+                    wait = max(wait, _retry_after(response))
+            if not retry or attempt == ATTEMPTS - 1:
+                self.stats.fail(count)
+                raise RuntimeError(
+                    f"Failed to POST {count} lines to {self.url}: {error}"
+                )
+            self.stats.retried += 1
+            logger.warning(f"HTTP POST failed, retrying in {wait:.2f}s: {error}")
+            await asyncio.sleep(wait)
+
+    def _send_batch(self, loglines: list):
+        """Buffer lines up to the batch size or body limit, then POST them.
+
+        Args:
+            loglines (list): Generated log lines to be sent, as bytes or str.
+        """
+        for logline in map(self._encode, loglines):
+            if self.buffer and (
+                len(self.buffer) >= self.buffer_size
+                or self.size + len(logline) > self.max_body
+            ):
+                self.write()
+            self.buffer.append(logline)
+            self.size += len(logline)
+        self.stats.report()
+
+    def write(self):
+        """Hand the buffered lines to the event loop as one request body."""
+        self._drain(self.max_pending)
+        if self.format == "ndjson":
+            body = b"".join(map(_ndjson, self.buffer))
+        else:
+            body = self._joined()
+        self.pending.append(self._run(self._post(len(self.buffer), body)))
+        self.buffer = []
+        self.size = 0
@@ -1,23 +1,47 @@
-import queue
+import json
+import os
+import struct
 import sys
-from multiprocessing import Event, JoinableQueue, Process
-from os import getpid
-from time import sleep
-
-from confluent_kafka import (
-    OFFSET_BEGINNING,
-    Consumer,
-    KafkaError,
-    Producer,
-    SerializingProducer,
-    TopicPartition,
-)
+from array import array
+from itertools import accumulate, repeat
+from multiprocessing import Process, Queue, Semaphore, current_process
+from queue import Empty
+from typing import Iterable, Optional, Tuple
+from zlib import crc32
+
+from confluent_kafka import Producer
 from loguru import logger
 from streams.base import Output
+from streams.keys import key_function
+from streams.metrics import DeliveryStats
 
 logger.remove()
 logger.add(sys.stdout, level="DEBUG")
 
+# Seconds producers wait at shutdown for their messages to be delivered
+FLUSH_TIMEOUT = 30
+
+
+def _reporting(stats: DeliveryStats) -> dict:
+    """Producer config counting deliveries, latencies and retries in `stats`."""
+
+    def delivered(err, msg):
+        if err:
+            stats.fail()
+        else:
+            stats.ack(msg.latency())
+
+    def statistics(report: str):
+        # Retried requests are only counted per broker
+        brokers = json.loads(report).get("brokers", {}).values()
+        stats.retried = sum(broker.get("txretries", 0) for broker in brokers)
+
+    return {
+        "on_delivery": delivered,
+        "stats_cb": statistics,
+        "statistics.interval.ms": int((stats.interval or 10) * 1000),
+    }
+
 
 class ConfluentKafka(Output):
     def __init__(
@@ -28,6 +52,9 @@ class ConfluentKafka(Output):
         schedule: dict,
         sasl_username: str,
         sasl_password: str,
+        burst: int = None,
+        stats_interval: float = 10,
+        key: str = None,
         **kwargs,
     ):
         """Kafka sink using the confluent_kafka library.
@@ -37,10 +64,16 @@ class ConfluentKafka(Output):
             topic (str): Topic to produce the messages to.
             rate (int): Rate per second to send.
             schedule (dict): Scheduled rate limits.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
             sasl_username (str): Optional SASL username.
             sasl_password (str): Optional SASL password.
+            stats_interval (float, optional): Seconds between delivery
+            summaries, 0 for only the final one. Defaults to 10.
+            key (str, optional): Key of each line, see
+            streams.keys.key_function. Defaults to None, no key.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
         extra_config = kwargs
         if all([sasl_password, sasl_username]):
             extra_config.update(
@@ -48,11 +81,14 @@ class ConfluentKafka(Output):
             )
         self.bootstrap_servers = broker
         self.topic = topic
+        self.key = key_function(key) if key else None
+        self.stats = DeliveryStats("Kafka", stats_interval)
         self.producer = Producer(
             {
                 "bootstrap.servers": ",".join(self.bootstrap_servers),
                 "linger.ms": 50,
             }
+            | _reporting(self.stats)
             | extra_config,
             logger=logger,
         )
@@ -65,33 +101,114 @@ class ConfluentKafka(Output):
 
     def close(self):
         try:
-            self.producer.flush(10)
+            # Flushing runs the delivery callbacks, so count what's left after
+            undelivered = self.producer.flush(10)
+            self.stats.failed += undelivered
         except Exception:
             print("Failed to produce all the messages to Kafka")
             raise
+        self.stats.report(final=True)
+        if self.stats.failed:
+            print("Failed to produce all the messages to Kafka")
 
-    @staticmethod
-    def _acked(err, msg):
-        global delivered_records
-        """Delivery report handler called on
-        successful or failed delivery of message
-        """
-        if err is not None:
-            print("Failed to deliver message: {}".format(err))
-        else:
-            print(
-                "Produced record to topic {} partition [{}] @ offset {}".format(
-                    msg.topic(), msg.partition(), msg.offset()
-                )
-            )
+    def _send_batch(self, loglines: list):
+        loglines = list(map(self._encode, loglines))
+        keys = map(self.key, loglines) if self.key else repeat(None)
+        for logline, key in zip(loglines, keys):
+            try:
+                self.producer.produce(self.topic, value=logline, key=key)
+            except BufferError:
+                self.producer.poll(10)
+                self.producer.produce(self.topic, value=logline, key=key)
+        self.producer.poll(0)
+        self.stats.report()
+
+
+def _pack(loglines: list, keys: list = None, partitions: list = None) -> bytes:
+    """Lines as a block of their count, their lengths and then the lines.
+
+    Keyed lines have the lengths of their keys and their partitions after
+    their own lengths, and their keys after the lines.
+    """
+    lengths = array("I", map(len, loglines))
+    if keys is None:
+        header = struct.pack("II", len(loglines), 0)
+        return header + lengths.tobytes() + b"".join(loglines)
+    lengths.extend(map(len, keys))
+    lengths.extend(partitions)
+    header = struct.pack("II", len(loglines), 1)
+    return header + lengths.tobytes() + b"".join(loglines) + b"".join(keys)
+
+
+def _split(block: bytes, lengths: array, start: int) -> list:
+    """Consecutive strings of `lengths` bytes in a block, from `start`."""
+    ends = accumulate(lengths, initial=start)
+    start = next(ends)
+    strings = []
+    for end in ends:
+        strings.append(block[start:end])
+        start = end
+    return strings
+
+
+def _unpack(block: bytes) -> Tuple[list, Iterable, Iterable]:
+    """Lines of a block from _pack, with their keys and partitions.
+
+    Unkeyed lines have no key and no partition, -1, leaving them to the
+    producer's partitioner.
+    """
+    count, keyed = struct.unpack_from("II", block)
+    lengths = array("I")
+    lengths.frombytes(block[8 : 8 + 4 * count * (3 if keyed else 1)])
+    start = 8 + 4 * len(lengths)
+    lines = _split(block, lengths[:count], start)
+    if not keyed:
+        return lines, repeat(None), repeat(-1)
+    keys = _split(block, lengths[count : 2 * count], start + sum(lengths[:count]))
+    return lines, keys, lengths[2 * count :]
+
+
+def _partition_count(config: dict, topic: str) -> int:
+    """Partitions of a topic, from the brokers' metadata.
 
-    def _send(self, logline: str):
+    Raises:
+        KafkaException: If the brokers can't be reached.
+        RuntimeError: If the brokers don't have the topic.
+    """
+    metadata = Producer(config).list_topics(topic, timeout=10).topics[topic]
+    if metadata.error is not None:
+        raise RuntimeError(
+            f"Couldn't get the partitions of {topic}: {metadata.error.str()}"
+        )
+    return len(metadata.partitions)
+
+
+def _produce(config: dict, topic: str, blocks, permits, results, stats_interval: float):
+    """Worker process producing blocks of lines until it's sent None.
+
+    Each block's permit is given back once its lines are handed to
+    librdkafka, which batches them by its own `linger.ms`. The producer is
+    only flushed at shutdown, when its delivery stats are put on `results`.
+    """
+    stats = DeliveryStats(f"Kafka {current_process().name}", stats_interval)
+    producer = Producer(_reporting(stats) | config)
+    for block in iter(blocks.get, None):
         try:
-            self.producer.produce(self.topic, value=logline)
-            self.producer.poll(0)
-        except BufferError:
-            self.producer.poll(10)
-            self.producer.produce(self.topic, value=logline)
+            for logline, key, partition in zip(*_unpack(block)):
+                while True:
+                    try:
+                        producer.produce(topic, logline, key=key, partition=partition)
+                        break
+                    except BufferError:
+                        producer.poll(0.1)
+            producer.poll(0)
+        finally:
+            permits.release()
+        stats.report()
+    # Flushing runs the delivery callbacks, so count what's left after
+    undelivered = producer.flush(FLUSH_TIMEOUT)
+    stats.failed += undelivered
+    results.put(stats.state())
 
 
 class ConfluentKafkaMP(Output):
@@ -103,20 +220,47 @@ class ConfluentKafkaMP(Output):
         schedule: dict,
         sasl_username: str,
         sasl_password: str,
-        buffer_size: int = 10000,
+        burst: int = None,
+        workers: int = None,
+        block_size: int = 2**20,
+        max_inflight: int = 64 * 2**20,
+        stats_interval: float = 10,
+        key: str = None,
         **kwargs,
     ):
         """Kafka sink using the confluent_kafka library and multiprocessing.
 
+        Lines are packed into blocks of about `block_size` bytes and handed to
+        a pool of producer processes, with at most `max_inflight` bytes of
+        blocks waiting on them.
+
+        Keyed lines are partitioned here, by the CRC32 of their key like
+        librdkafka's default partitioner, and each producer owns the
+        partitions that are its index modulo the number of producers. Every
+        producer then only batches for its own partitions, so its batches are
+        larger and the lines of a key are produced in order.
+
         Args:
             broker (list): List of brokers to connect to.
             topic (str): Topic to produce the messages to.
             rate (int, optional): Rate per second to send.
             schedule (dict, optional): Scheduled rate limits.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
             sasl_username (str): Optional SASL username.
             sasl_password (str): Optional SASL password.
+            workers (int, optional): Producer processes, at most one per
+            partition when keyed. Defaults to one per core.
+            block_size (int, optional): Bytes of lines handed to a producer at
+            once. Defaults to 1MiB.
+            max_inflight (int, optional): Most bytes of blocks waiting on the
+            producers. Defaults to 64MiB.
+            stats_interval (float, optional): Seconds between each producer's
+            delivery summaries, 0 for only the final one. Defaults to 10.
+            key (str, optional): Key of each line, see
+            streams.keys.key_function. Defaults to None, no key.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
         extra_config = kwargs
         if all([sasl_password, sasl_username]):
             extra_config.update(
@@ -124,25 +268,44 @@ class ConfluentKafkaMP(Output):
             )
         self.bootstrap_servers = broker
         self.topic = topic
-        self.partition_count = 4
-        self.producer_queue = JoinableQueue(maxsize=100)
-        self.producer_shutdown = Event()
+        self.key = key_function(key) if key else None
         config = {
             "bootstrap.servers": ",".join(self.bootstrap_servers),
             "linger.ms": 50,
         } | extra_config
+        workers = workers or os.cpu_count()
+        self.partitions: Optional[int] = None
+        if self.key:
+            self.partitions = _partition_count(config, topic)
+            workers = min(workers, self.partitions)
+        self.block_size = block_size
+        self.blocks = [[] for _ in range(workers)]
+        self.block_keys = [[] for _ in range(workers)]
+        self.block_partitions = [[] for _ in range(workers)]
+        self.block_bytes = [0] * workers
+        # Unkeyed blocks go to each producer in turn
+        self.turn = 0
+        self.queues = [Queue() for _ in range(workers)]
+        self.permits = Semaphore(max(1, max_inflight // block_size))
+        self.results = Queue()
+        self.stats = DeliveryStats("Kafka", stats_interval)
         self.producers = [
             Process(
-                target=self.producer,
+                target=_produce,
                 name=f"producer_{idx}",
-                args=(self.producer_queue, self.producer_shutdown, config),
+                args=(
+                    config,
+                    topic,
+                    queue,
+                    self.permits,
+                    self.results,
+                    stats_interval,
+                ),
+                daemon=True,
             )
-            for idx in range(self.partition_count)
+            for idx, queue in enumerate(self.queues)
         ]
-        self.buffer_size = buffer_size
-        self.message_buffer = []
         for proc in self.producers:
-            proc.daemon = True
             proc.start()
 
     def __enter__(self):
@@ -151,39 +314,81 @@ class ConfluentKafkaMP(Output):
     def __exit__(self, type, value, traceback):
         self.close()
 
+    def _put_block(self, worker: int):
+        # Wait for a permit, checking the producers are still running
+        while not self.permits.acquire(timeout=1):
+            if not all(proc.is_alive() for proc in self.producers):
+                raise RuntimeError("A Kafka producer process stopped unexpectedly.")
+        if self.key:
+            block = _pack(
+                self.blocks[worker],
+                self.block_keys[worker],
+                self.block_partitions[worker],
+            )
+        else:
+            block = _pack(self.blocks[worker])
+        self.queues[worker].put(block)
+        self.blocks[worker] = []
+        self.block_keys[worker] = []
+        self.block_partitions[worker] = []
+        self.block_bytes[worker] = 0
+
+    def _result(self) -> dict:
+        """Delivery stats of the next producer to finish.
+
+        Raises:
+            RuntimeError: If a producer stopped without giving its stats.
+        """
+        while True:
+            try:
+                return self.results.get(timeout=1)
+            except Empty:
+                failed = [proc for proc in self.producers if proc.exitcode]
+                if failed:
+                    raise RuntimeError(
+                        "Kafka producer processes stopped unexpectedly: "
+                        + ", ".join(f"{p.name} (exit {p.exitcode})" for p in failed)
+                    )
+
     def close(self):
+        for worker, block in enumerate(self.blocks):
+            if block:
+                self._put_block(worker)
+        for queue in self.queues:
+            queue.put(None)
         try:
-            self.producer_queue.put(self.message_buffer)
-            while not self.producer_queue.empty():
-                sleep(0.2)
-            self.producer_shutdown.set()
-        except Exception:
+            for _ in self.producers:
+                self.stats.merge(self._result())
+        finally:
+            for proc in self.producers:
+                proc.join(10)
+                # Producers still flushing are left to end with this process
+                if proc.exitcode is not None:
+                    proc.close()
+        self.stats.report(final=True)
+        if self.stats.failed:
             print("Failed to produce all the messages to Kafka")
-            raise
-        for proc in self.producers:
-            proc.join(10)
-            proc.close()
 
-    def producer(self, producer_queue, shutdown, config):
-        p = Producer(config)
-        while not shutdown.is_set():
-            p.poll(0)
-            try:
-                messages = producer_queue.get(block=True, timeout=0.1)
-            except queue.Empty:
-                continue
-            else:
-                for message in messages:
-                    try:
-                        p.produce(self.topic, message)
-                    except BufferError:
-                        p.poll(10)
-                        p.produce(self.topic, message)
-                p.flush(10)
-                producer_queue.task_done()
-
-    def _send(self, logline: str):
-        self.message_buffer.append(logline)
-        if len(self.message_buffer) > self.buffer_size:
-            self.producer_queue.put(self.message_buffer)
-            self.message_buffer = []
+    def _send_batch(self, loglines: list):
+        loglines = list(map(self._encode, loglines))
+        if not self.key:
+            worker = self.turn
+            self.blocks[worker].extend(loglines)
+            self.block_bytes[worker] += sum(map(len, loglines))
+            if self.block_bytes[worker] >= self.block_size:
+                self._put_block(worker)
+                self.turn = (worker + 1) % len(self.producers)
+            return
+
+        workers = len(self.producers)
+        partitions = self.partitions
+        for logline, key in zip(loglines, map(self.key, loglines)):
+            partition = crc32(key) % partitions
+            worker = partition % workers
+            self.blocks[worker].append(logline)
+            self.block_keys[worker].append(key)
+            self.block_partitions[worker].append(partition)
+            self.block_bytes[worker] += len(logline) + len(key)
+        for worker, size in enumerate(self.block_bytes):
+            if size >= self.block_size:
+                self._put_block(worker)
@@ -1,6 +1,11 @@
+import time
+from itertools import repeat
+
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
 from streams.base import Output
+from streams.keys import key_function
+from streams.metrics import DeliveryStats
 
 
 class Kafka(Output):
@@ -12,6 +17,9 @@ class Kafka(Output):
         schedule: dict,
         sasl_username: str,
         sasl_password: str,
+        burst: int = None,
+        stats_interval: float = 10,
+        key: str = None,
         **kwargs,
     ):
         """Kafka sink using the kafka=python library.
@@ -21,10 +29,16 @@ class Kafka(Output):
             topic (str): Topic to produce the messages to.
             rate (int, optional): Rate per second to send.
             schedule (dict, optional): Scheduled rate limits.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
             sasl_username (str): Optional SASL username.
             sasl_password (str): Optional SASL password.
+            stats_interval (float, optional): Seconds between delivery
+            summaries, 0 for only the final one. Defaults to 10.
+            key (str, optional): Key of each line, see
+            streams.keys.key_function. Defaults to None, no key.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
         extra_config = {k.replace(".", "_"): v for k, v in kwargs.items()}
         if all([sasl_password, sasl_username]):
             extra_config.update(
@@ -35,9 +49,12 @@ class Kafka(Output):
             )
         self.bootstrap_servers = broker
         self.topic = topic
+        self.key = key_function(key) if key else None
         self.producer = KafkaProducer(
             bootstrap_servers=self.bootstrap_servers, linger_ms=50, **extra_config
         )
+        self.stats = DeliveryStats("Kafka", stats_interval, self._count_retries)
+        self.checked = time.monotonic()
 
     def __enter__(self):
         return self
@@ -51,10 +68,34 @@ class Kafka(Output):
         except Exception:
             print("Failed to produce all the messages to Kafka")
             raise
+        self.stats.report(final=True)
+        if self.stats.failed:
+            print("Failed to produce all the messages to Kafka")
+
+    def _acked(self, sent: float, metadata):
+        self.stats.ack(time.monotonic() - sent)
+
+    def _failed(self, exception: Exception):
+        self.stats.fail()
+
+    def _count_retries(self):
+        # kafka-python only gives the rate of retries, so the count is estimated
+        now = time.monotonic()
+        metrics = self.producer.metrics().get("producer-metrics", {})
+        self.stats.retried += round(
+            metrics.get("record-retry-rate", 0) * (now - self.checked)
+        )
+        self.checked = now
 
-    def _send(self, logline: str):
+    def _send_batch(self, loglines: list):
+        loglines = list(map(self._encode, loglines))
+        keys = map(self.key, loglines) if self.key else repeat(None)
         try:
-            self.producer.send(self.topic, logline.encode("UTF-8"))
+            for logline, key in zip(loglines, keys):
+                self.producer.send(self.topic, logline, key=key).add_callback(
+                    self._acked, time.monotonic()
+                ).add_errback(self._failed)
         except KafkaError as e:
             print(e)
             raise e
+        self.stats.report()
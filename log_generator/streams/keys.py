@@ -0,0 +1,94 @@
+"""Partition keys for log lines.
+
+Sinks that spread lines across shards or partitions key each line with one of
+these, so lines from a client land together (`apache`, `cloudfront`,
+`cloudflare` or a `regex:` of your own) or are spread evenly (`random`,
+`uuid`). Keys are extracted from the raw bytes of each line without parsing
+the rest of it.
+"""
+
+import os
+import re
+import uuid
+from functools import partial
+from typing import Callable
+
+
+def _json_field(name: str) -> Callable[[bytes], bytes]:
+    """Extractor of a string field from a JSON line, found by its key."""
+    marker = f'"{name}":"'.encode()
+
+    def extract(line: bytes) -> bytes:
+        start = line.index(marker) + len(marker)
+        return line[start : line.index(b'"', start)]
+
+    return extract
+
+
+# Field extractors of each log type's client IP, given the bytes of a line
+FIELDS = {
+    "apache": lambda line: line.partition(b" ")[0],
+    "cloudfront": lambda line: line.split(None, 5)[4],
+    "cloudflare": _json_field("ClientIP"),
+}
+
+
+def _random(line: bytes) -> bytes:
+    return os.urandom(8).hex().encode()
+
+
+def _uuid(line: bytes) -> bytes:
+    return uuid.uuid4().hex.encode()
+
+
+def _group(pattern: re.Pattern, line: bytes) -> bytes:
+    match = pattern.search(line)
+    return match.group(match.lastindex or 0)
+
+
+def _extracting(extract: Callable) -> Callable:
+    """Key function using `extract`, falling back to a random key.
+
+    Lines the extractor can't find a key in, such as corrupted ones, get a
+    random key rather than piling up on a single shard.
+    """
+    if isinstance(extract, re.Pattern):
+        extract = partial(_group, extract)
+
+    def key(line: bytes) -> bytes:
+        try:
+            return extract(line) or _random(line)
+        except (AttributeError, IndexError, ValueError):
+            return _random(line)
+
+    return key
+
+
+def key_function(name: str) -> Callable[[bytes], bytes]:
+    """Function giving the partition key of a line.
+
+    Args:
+        name (str): A log type in FIELDS, `random`, `uuid`, or `regex:PATTERN`
+        keying lines on the first group of PATTERN, else its whole match.
+
+    Raises:
+        ValueError: If the name or pattern isn't valid.
+
+    Returns:
+        Callable[[bytes], bytes]: Key of a line given as bytes.
+    """
+    if name == "random":
+        return _random
+    if name == "uuid":
+        return _uuid
+    if name.startswith("regex:"):
+        try:
+            return _extracting(re.compile(name[len("regex:") :].encode()))
+        except re.error as e:
+            raise ValueError(f"Invalid key pattern: {e}.")
+    if name.lower() in FIELDS:
+        return _extracting(FIELDS[name.lower()])
+    raise ValueError(
+        f"Unknown key '{name}', choose from {', '.join(FIELDS)}, random, uuid "
+        "or regex:PATTERN."
+    )
@@ -1,60 +1,210 @@
-from datetime import datetime, timezone
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
 
 import boto3
-from botocore.exceptions import ClientError
-from streams.base import Output
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from loguru import logger
+from streams.aggregation import FORMATS, Aggregator
+from streams.base import Output, backoff
+from streams.keys import key_function
+
+# PutRecords limits on the records, and their bytes, in a single request
+MAX_RECORDS = 500
+MAX_REQUEST_BYTES = 5 * 2**20
+# Longest partition key Kinesis accepts
+MAX_KEY_LENGTH = 256
+# Attempts at each batch before the stream is given up on
+ATTEMPTS = 8
 
 
 class Kinesis(Output):
-    def __init__(self, stream: str, rate: int = None, schedule: dict = None):
+    def __init__(
+        self,
+        stream: str,
+        rate: int = None,
+        schedule: dict = None,
+        burst: int = None,
+        key: str = "random",
+        workers: int = 4,
+        endpoint_url: str = None,
+        aggregate: str = None,
+        max_buffered_time: float = 1,
+    ):
         """Kinesis sink using the boto3 library.
 
+        Lines are batched up to the PutRecords limits and sent on a pool of
+        workers. Records that fail in a batch, such as ones throttled by a
+        busy shard, are retried on their own with backoff.
+
         Args:
             stream (str): Stream to produce the messages to.
             rate (int, optional): Rate per second to send. Defaults to None.
             schedule (dict, optional): Scheduled rate limits. Defaults to None.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
+            key (str, optional): Partition key of each line, see
+            streams.keys.key_function. Defaults to "random".
+            workers (int, optional): PutRecords requests sent at once.
+            Defaults to 4.
+            endpoint_url (str, optional): Kinesis compatible endpoint to use
+            instead of AWS. Defaults to None.
+            aggregate (str, optional): Pack lines into records in this format
+            from streams.aggregation.FORMATS. Defaults to None, a record per
+            line.
+            max_buffered_time (float, optional): Most seconds a line waits in
+            a partly filled record or request before it's sent anyway, like
+            the KPL's RecordMaxBufferedTime. It's checked as lines are sent,
+            0 to only send full ones. Defaults to 1.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
         self.stream = stream
-        self.buffer_size = 500
-        self.client = boto3.client("kinesis")
+        self.buffer_size = MAX_RECORDS
+        self.key = key_function(key)
+        # botocore can't retry the records a PutRecords response rejects, so
+        # its retries are off and _put_records retries failed requests too
+        self.client = boto3.client(
+            "kinesis",
+            endpoint_url=endpoint_url,
+            config=Config(retries={"total_max_attempts": 1}),
+        )
+        self.workers = ThreadPoolExecutor(workers)
+        self.pending = deque()
+        self.max_pending = 2 * workers
+        self.retried = 0
+        self.lock = threading.Lock()
+        self.aggregate = aggregate
+        self.max_buffered_time = max_buffered_time
+        if aggregate and aggregate not in FORMATS:
+            raise ValueError(f"Unknown aggregation format '{aggregate}'.")
 
     def __enter__(self):
         self.buffer = []
+        self.size = 0
+        self.aggregators = None
+        # When the oldest line still waiting to be sent was buffered
+        self.oldest = None
+        if self.aggregate:
+            # Lines are aggregated per shard, so each keeps to the shard its
+            # own key hashes to
+            self.starts = self._shard_starts()
+            self.aggregators = [Aggregator(self.aggregate) for _ in self.starts]
         return self
 
+    def _shard_starts(self) -> list:
+        """Lowest hash key of each open shard of the stream, in order."""
+        starts = []
+        response = self.client.list_shards(StreamName=self.stream)
+        while True:
+            starts.extend(
+                int(shard["HashKeyRange"]["StartingHashKey"])
+                for shard in response["Shards"]
+                if "EndingSequenceNumber" not in shard["SequenceNumberRange"]
+            )
+            if not response.get("NextToken"):
+                return sorted(starts)
+            response = self.client.list_shards(NextToken=response["NextToken"])
+
     def __exit__(self, type, value, traceback):
-        if len(self.buffer) > 0:
-            self.write()
+        try:
+            if type is None:
+                self._flush()
+                self._drain()
+                if self.retried:
+                    logger.info(f"Retried {self.retried:,} failed Kinesis records.")
+        finally:
+            self.workers.shutdown(cancel_futures=True)
 
-    def _send(self, logline: str):
-        """Send proxy to write to a buffer until the size is reached.
+    def _send_batch(self, loglines: list):
+        """Buffer lines as records, writing a request whenever one fills up.
+
+        With `aggregate` set, lines are packed into a record per shard first.
 
         Args:
-            logline (str): Generated log line to be sent.
+            loglines (list): Generated log lines to be sent, as bytes or str.
         """
-        self.buffer.append(
-            {"Data": logline.encode("utf-8"), "PartitionKey": logline[:10]}
-        )
-        if len(self.buffer) >= self.buffer_size:
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        for data in map(self._encode, loglines):
+            key = self.key(data)[:MAX_KEY_LENGTH]
+            if self.aggregators is None:
+                self._add(key, data)
+                continue
+            # Kinesis maps keys to shards by the MD5 digest as a 128 bit number
+            shard = (
+                bisect_right(self.starts, int.from_bytes(md5(key).digest(), "big")) - 1
+            )
+            finished = self.aggregators[shard].add(key, data)
+            if finished:
+                self._add(*finished, self.starts[shard])
+        if self.max_buffered_time and (
+            time.monotonic() - self.oldest >= self.max_buffered_time
+        ):
+            self._flush()
+
+    def _flush(self):
+        """Send every buffered line, however few there are."""
+        for shard, aggregator in enumerate(self.aggregators or []):
+            if len(aggregator):
+                self._add(*aggregator.finish(), self.starts[shard])
+        if self.buffer:
             self.write()
+        self.oldest = None
 
-    def write(self):
-        """Write the buffer to Kinesis.
+    def _add(self, key: bytes, data: bytes, hash_key: int = None):
+        """Add a record to the buffer, writing it first if it's full."""
+        record = {"Data": data, "PartitionKey": key.decode("utf-8", "replace")}
+        if hash_key is not None:
+            record["ExplicitHashKey"] = str(hash_key)
+        size = len(data) + len(record["PartitionKey"])
+        if len(self.buffer) >= self.buffer_size or (
+            self.size + size > MAX_REQUEST_BYTES
+        ):
+            self.write()
+        self.buffer.append(record)
+        self.size += size
+
+    def _put_records(self, records: list):
+        """Send records, retrying the failed ones until they're all in.
 
         Raises:
-            e: Exception if we fail to send a batch of data.
+            RuntimeError: If records still fail after every attempt.
         """
-        try:
-            response = self.client.put_records(
-                Records=self.buffer, StreamName=self.stream
-            )
-            if "FailedRecordCount" in response and response["FailedRecordCount"] > 0:
-                assert (
-                    False
-                ), f"""There were {response["FailedRecordCount"]} records failed to go to {self.stream}"""
-        except Exception as e:
-            print(e)
-            raise e
+        for attempt in range(ATTEMPTS):
+            try:
+                response = self.client.put_records(
+                    Records=records, StreamName=self.stream
+                )
+            except (BotoCoreError, ClientError) as e:
+                if attempt == ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Kinesis put_records failed, retrying: {e}")
+            else:
+                if not response.get("FailedRecordCount"):
+                    return
+                failed = [
+                    (record, result)
+                    for record, result in zip(records, response["Records"])
+                    if "ErrorCode" in result
+                ]
+                if attempt == ATTEMPTS - 1:
+                    raise RuntimeError(
+                        f"{len(failed)} records failed to go to {self.stream}, "
+                        f"the first with {failed[0][1]['ErrorCode']}: "
+                        f"{failed[0][1].get('ErrorMessage')}"
+                    )
+                records = [record for record, _ in failed]
+                with self.lock:
+                    self.retried += len(records)
+            time.sleep(backoff(attempt))
 
+    def write(self):
+        """Hand the buffered records to a worker as one PutRecords request."""
+        self._drain(self.max_pending)
+        self.pending.append(self.workers.submit(self._put_records, self.buffer))
         self.buffer = []
+        self.size = 0
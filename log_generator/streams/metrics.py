@@ -0,0 +1,149 @@
+import time
+from typing import Callable
+
+from loguru import logger
+
+# Sub buckets per power of two, 16 keeps values within about 6% of their bucket
+SUB_BITS = 4
+# Latencies above this many microseconds are counted as this
+HIGHEST = 100_000_000
+
+
+def _index(value: int) -> int:
+    """Bucket of a value, exact below 32 and log-linear above."""
+    if value < 2 ** (SUB_BITS + 1):
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return (shift << SUB_BITS) + (value >> shift)
+
+
+def _midpoint(index: int) -> float:
+    """Middle of the values in a bucket."""
+    if index < 2 ** (SUB_BITS + 1):
+        return index
+    shift = (index >> SUB_BITS) - 1
+    top = index - (shift << SUB_BITS)
+    return ((top << shift) + ((top + 1) << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    def __init__(self):
+        """Latencies counted in log-linear buckets, like an HDR histogram.
+
+        Memory is fixed however many latencies are recorded, from 1µs up to
+        100s at about 6% precision.
+        """
+        self.counts = [0] * (_index(HIGHEST) + 1)
+        self.max = 0
+
+    def record(self, seconds: float):
+        # This runs for every message, so _index is inlined
+        micros = int(seconds * 1_000_000)
+        if micros > self.max:
+            micros = self.max = min(micros, HIGHEST)
+        elif micros > HIGHEST:
+            micros = HIGHEST
+        if micros < 2 ** (SUB_BITS + 1):
+            self.counts[micros] += 1
+        else:
+            shift = micros.bit_length() - SUB_BITS - 1
+            self.counts[(shift << SUB_BITS) + (micros >> shift)] += 1
+
+    def merge(self, counts: list, highest: int):
+        """Add the counts of another histogram, and its highest latency."""
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.max = max(self.max, highest)
+
+    def percentile(self, percent: float) -> float:
+        """Latency in seconds that `percent` of latencies are within."""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        target = total * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_midpoint(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def summary(self) -> str:
+        return " ".join(
+            f"{name} {seconds * 1000:.1f}ms"
+            for name, seconds in [
+                ("p50", self.percentile(50)),
+                ("p90", self.percentile(90)),
+                ("p99", self.percentile(99)),
+                ("p99.9", self.percentile(99.9)),
+                ("max", self.max / 1_000_000),
+            ]
+        )
+
+
+class DeliveryStats:
+    def __init__(self, name: str, interval: float = 10, refresh: Callable = None):
+        """Delivery counts and latencies of a sink, logged every `interval`.
+
+        Counts are updated from delivery callbacks. Some clients run those on
+        a thread of their own, which is fine as long as it's the only thread
+        updating them, summaries only read the counts.
+
+        Args:
+            name (str): Name of the sink in the summaries.
+            interval (float, optional): Seconds between summaries, 0 for only
+            the final one. Defaults to 10.
+            refresh (Callable, optional): Called before each summary, to update
+            counts the client only gives on request. Defaults to None.
+        """
+        self.name = name
+        self.interval = interval
+        self.refresh = refresh
+        self.acked = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency = LatencyHistogram()
+        self.started = self.reported = time.monotonic()
+
+    def ack(self, latency: float = None, count: int = 1):
+        """Count `count` messages delivered together in `latency` seconds."""
+        self.acked += count
+        if latency is not None:
+            self.latency.record(latency)
+
+    def fail(self, count: int = 1):
+        self.failed += count
+
+    def state(self) -> dict:
+        """Counts that can be sent between processes and merged."""
+        return {
+            "acked": self.acked,
+            "failed": self.failed,
+            "retried": self.retried,
+            "counts": list(self.latency.counts),
+            "max": self.latency.max,
+        }
+
+    def merge(self, state: dict):
+        """Add the counts from another sink's state()."""
+        self.acked += state["acked"]
+        self.failed += state["failed"]
+        self.retried += state["retried"]
+        self.latency.merge(state["counts"], state["max"])
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"{self.name}: {self.acked:,} acked "
+            f"({self.acked / elapsed if elapsed else 0:,.0f}/s), "
+            f"{self.failed:,} failed, {self.retried:,} retried, "
+            f"latency {self.latency.summary()}"
+        )
+
+    def report(self, final: bool = False):
+        """Log a summary if one is due, or always if it's the final one."""
+        now = time.monotonic()
+        if final or (self.interval and now - self.reported >= self.interval):
+            self.reported = now
+            if self.refresh:
+                self.refresh()
+            logger.info(self.summary())
@@ -1,9 +1,19 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from io import BytesIO
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from loguru import logger
+from streams.base import ByteBudget, Output, backoff, compressor
 
-# from botocore.exceptions import ClientError
-from streams.base import Output
+# Smallest part S3 accepts, other than the last part of an upload
+MIN_PART_SIZE = 5 * 2**20
+# Attempts at each request before the upload is given up on
+ATTEMPTS = 5
 
 
 class S3(Output):
@@ -14,66 +24,201 @@ class S3(Output):
         key_line_count: int,
         rate: int = None,
         schedule: dict = None,
+        burst: int = None,
         compressed: bool = False,
+        endpoint_url: str = None,
+        part_size: int = 8 * 2**20,
+        workers: int = 8,
+        max_inflight: int = None,
     ):
         """AWS Simple Storage Service sink using boto3.
 
+        Objects are uploaded in parts of `part_size` bytes as they're streamed,
+        on a pool of workers, so streaming only waits on S3 when the bytes in
+        flight reach `max_inflight`. Objects smaller than a part are uploaded
+        with a single put.
+
         Args:
             bucket (str): Bucket to write to.
             prefix (str): Prefix to add to all the keys.
             rate (int, optional): Ratelimit per second to collect log lines.
             Defaults to None.
             schedule (dict, optional): Scheduled ratelimits. Defaults to None.
+            burst (int, optional): Most lines to send at once when catching up
+            with the rate. Defaults to 10ms worth of lines.
             key_line_count (int, optional): Size of files prior to upload in lines.
             Defaults to 1000.
             compressed (bool, optional): Compress the resulting keys. Defaults to False.
+            endpoint_url (str, optional): S3 compatible endpoint to use instead
+            of AWS, such as a local stand in. Defaults to None.
+            part_size (int, optional): Bytes per uploaded part, at least 5MiB.
+            Defaults to 8MiB.
+            workers (int, optional): Parts uploaded at once. Defaults to 8.
+            max_inflight (int, optional): Most bytes waiting on or being
+            uploaded. Defaults to two parts per worker.
         """
-        super().__init__(rate=rate, schedule=schedule)
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
+        if part_size < MIN_PART_SIZE:
+            raise ValueError("S3 parts have to be at least 5MiB.")
         self.compressed = compressed
         self.buffer_size = key_line_count
         self.bucket = bucket
         self.prefix = prefix
-        self.s3 = boto3.client("s3")
-        self.suffix = ".log"
+        # _retry backs off each request itself, botocore retrying underneath
+        # would multiply the attempts at every part
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            config=Config(retries={"total_max_attempts": 1}),
+        )
+        self.suffix = ".log.gz" if compressed else ".log"
+        self.part_size = part_size
+        self.workers = ThreadPoolExecutor(workers)
+        self.budget = ByteBudget(max_inflight or 2 * workers * part_size)
+        self.pending = deque()
+        # Multipart uploads started and not yet completed, by upload ID
+        self.uploads = {}
+        self.key = None
 
     def __enter__(self, buffer_size=1000):
         return self
 
     def __exit__(self, type, value, traceback):
-        if len(self.buffer) > 0:
-            now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-            self.write(now)
+        try:
+            if type is None:
+                if self.key is not None:
+                    self.write()
+                self._drain()
+        finally:
+            # After a failure, objects not yet uploaded are given up on and
+            # open multipart uploads aborted, so S3 doesn't keep their parts
+            self.workers.shutdown(cancel_futures=True)
+            for upload_id, key in list(self.uploads.items()):
+                try:
+                    self._abort(key, upload_id)
+                except (BotoCoreError, ClientError) as e:
+                    logger.warning(f"S3 failed to abort upload of {key}: {e}")
 
-    def _send(self, logline: str):
-        """Send proxy to write to a buffer until the size is reached.
+    def _retry(self, request: str, **kwargs) -> dict:
+        """Make an S3 request, retrying failures with backoff."""
+        for attempt in range(ATTEMPTS):
+            try:
+                return getattr(self.s3, request)(Bucket=self.bucket, **kwargs)
+            except (BotoCoreError, ClientError) as e:
+                if attempt == ATTEMPTS - 1:
+                    raise
+                wait = backoff(attempt)
+                logger.warning(f"S3 {request} failed, retrying in {wait:.2f}s: {e}")
+                time.sleep(wait)
 
-        Args:
-            logline (str): Generated log line to be sent.
-        """
-        self.buffer.append(logline)
-        if len(self.buffer) >= self.buffer_size:
-            # TODO - Naming template instead of just using ISO timestamps.
-            now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-            self.write(now)
+    def _open(self):
+        """Start a new object named after the current time."""
+        now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+        self.key = f"{self.prefix}{now}{self.suffix}"
+        self.lines = 0
+        self.upload_id = None
+        self.parts = []
+        self.body = BytesIO()
+        self.writer = compressor(self.body, "gzip") if self.compressed else self.body
+
+    def _upload_part(self, key: str, upload_id: str, number: int, data: bytes):
+        try:
+            response = self._retry(
+                "upload_part",
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=data,
+            )
+        finally:
+            self.budget.release(len(data))
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def _abort(self, key: str, upload_id: str):
+        self.uploads.pop(upload_id, None)
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
 
-    def write(self, key: str):
-        """Write the buffer to S3.
+    def _complete(self, key: str, upload_id: str, parts: list):
+        try:
+            self._retry(
+                "complete_multipart_upload",
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [part.result() for part in parts]},
+            )
+        except Exception:
+            self._abort(key, upload_id)
+            raise
+        del self.uploads[upload_id]
+
+    def _put(self, key: str, data: bytes):
+        try:
+            self._retry(
+                "put_object",
+                Key=key,
+                ContentType="text/plain",
+                ContentEncoding="gzip" if self.compressed else "utf-8",
+                Body=data,
+            )
+        finally:
+            self.budget.release(len(data))
+
+    def _cut(self):
+        """Hand the bytes written so far to a worker as the next part."""
+        if self.upload_id is None:
+            self.upload_id = self._retry(
+                "create_multipart_upload",
+                Key=self.key,
+                ContentType="text/plain",
+                ContentEncoding="gzip" if self.compressed else "utf-8",
+            )["UploadId"]
+            self.uploads[self.upload_id] = self.key
+        data = self.body.getvalue()
+        self.body.seek(0)
+        self.body.truncate()
+        self.budget.acquire(len(data))
+        self.parts.append(
+            self.workers.submit(
+                self._upload_part, self.key, self.upload_id, len(self.parts) + 1, data
+            )
+        )
+
+    def _send_batch(self, loglines: list):
+        """Stream lines into the open object, cutting parts as they fill.
 
         Args:
-            key (str): File key to write to.
+            loglines (list): Generated log lines to be sent, as bytes or str.
         """
-        # TODO - Add error handling in this method.
-        if self.compressed:
-            self._compress(method="gzip")
+        # Raise the errors of uploads that already failed
+        for upload in [upload for upload in self.pending if upload.done()]:
+            self.pending.remove(upload)
+            upload.result()
+        while loglines:
+            if self.key is None:
+                self._open()
+            fits = min(len(loglines), self.buffer_size - self.lines)
+            self.writer.write(self._joined(loglines[:fits]))
+            self.lines += fits
+            loglines = loglines[fits:]
+            if self.body.tell() >= self.part_size:
+                self._cut()
+            if self.lines >= self.buffer_size:
+                self.write()
+
+    def write(self):
+        """Finish the open object, its last part uploads in the background."""
+        if self.writer is not self.body:
+            self.writer.close()
+        if self.upload_id is None:
+            data = self.body.getvalue()
+            self.budget.acquire(len(data))
+            self.pending.append(self.workers.submit(self._put, self.key, data))
         else:
-            self._write()
-        # s3_object = self.s3.Object(self.bucket, f"{self.prefix}{key}{self.suffix}")
-        # s3_object.put(Body="".join(self.buffer))
-        self.s3.put_object(
-            Bucket=self.bucket,
-            Key=f"{self.prefix}{key}{self.suffix}",
-            ContentType="text/plain",
-            ContentEncoding="gzip" if self.compressed else "utf-8",
-            Body=self.body.getvalue(),
-        )
-        self._reset()
+            if self.body.tell():
+                self._cut()
+            self.pending.append(
+                self.workers.submit(
+                    self._complete, self.key, self.upload_id, self.parts
+                )
+            )
+        self.key = None
@@ -0,0 +1,153 @@
+import numpy as np
+
+# Seconds between the points of a compiled timeline, unless a schedule sets it
+RESOLUTION = 1.0
+
+
+def _constant(ticks: np.ndarray, rate: float) -> np.ndarray:
+    return np.full(len(ticks), float(rate))
+
+
+def _ramp(ticks: np.ndarray, start: float, end: float, duration: float) -> np.ndarray:
+    return start + (end - start) * ticks / duration
+
+
+def _positive(name: str, value: float):
+    if value <= 0:
+        raise ValueError(f"Schedule {name} has to be positive, not {value}.")
+
+
+def _steps(ticks: np.ndarray, rates: list, interval: float) -> np.ndarray:
+    if not rates:
+        raise ValueError("Schedule step segments need at least one rate.")
+    _positive("step interval", interval)
+    return np.asarray(rates, dtype=float)[(ticks // interval).astype(int) % len(rates)]
+
+
+def _sine(
+    ticks: np.ndarray, base: float, amplitude: float, period: float, phase: float = 0
+) -> np.ndarray:
+    _positive("sine period", period)
+    return base + amplitude * np.sin(2 * np.pi * (ticks + phase) / period)
+
+
+def _diurnal(
+    ticks: np.ndarray, low: float, high: float, peak: float = 14, day: float = 86400
+) -> np.ndarray:
+    _positive("diurnal day", day)
+    # A day long cosine, highest at the `peak` hour and lowest 12 hours later
+    hours = ticks / day * 24
+    return low + (high - low) * (1 + np.cos(2 * np.pi * (hours - peak) / 24)) / 2
+
+
+def _bursts(
+    ticks: np.ndarray, base: float, rate: float, every: float, length: float
+) -> np.ndarray:
+    _positive("burst every", every)
+    return np.where(ticks % every < length, rate, base).astype(float)
+
+
+# Segment type to how it's compiled, and the options it takes
+SEGMENTS = {
+    "constant": (_constant, ("rate",)),
+    "ramp": (_ramp, ("start", "end", "duration")),
+    "step": (_steps, ("rates", "interval")),
+    "sine": (_sine, ("base", "amplitude", "period", "phase")),
+    "diurnal": (_diurnal, ("low", "high", "peak", "day")),
+    "burst": (_bursts, ("base", "rate", "every", "length")),
+}
+
+
+class Timeline:
+    def __init__(self, schedule: dict):
+        """Load shape compiled into target rates at fixed time steps.
+
+        A schedule is a list of segments played one after the other, each
+        with a `type` from SEGMENTS, its options and a `duration` in seconds:
+
+            {
+                "resolution": 1,
+                "repeat": false,
+                "segments": [
+                    {"type": "ramp", "start": 10, "end": 1000, "duration": 300},
+                    {"type": "sine", "base": 500, "amplitude": 200,
+                     "period": 600, "duration": 1800},
+                    {"type": "burst", "base": 500, "rate": 5000, "every": 60,
+                     "length": 5, "duration": 600}
+                ],
+                "bursts": [{"at": 120, "duration": 10, "rate": 2000}]
+            }
+
+        `bursts` adds extra rate on top of the segments for a while. Repeating
+        schedules cycle forever, others end after the total of the durations.
+        The legacy `update_interval` and `schedule` keys are a repeating step.
+
+        Args:
+            schedule (dict): Deserialised schedule JSON.
+
+        Raises:
+            KeyError: If the schedule or a segment is missing a key.
+            ValueError: If the resolution, a segment type or option is invalid.
+        """
+        if "update_interval" in schedule:
+            schedule = {
+                "repeat": True,
+                "segments": [
+                    {
+                        "type": "step",
+                        "rates": schedule["schedule"],
+                        "interval": schedule["update_interval"],
+                        "duration": schedule["update_interval"]
+                        * len(schedule["schedule"]),
+                    }
+                ],
+            }
+
+        self.resolution = float(schedule.get("resolution", RESOLUTION))
+        _positive("resolution", self.resolution)
+        self.repeat = bool(schedule.get("repeat", False))
+        parts = []
+        for segment in schedule["segments"]:
+            if segment["type"] not in SEGMENTS:
+                raise ValueError(f"Unknown schedule segment '{segment['type']}'.")
+            compile_segment, options = SEGMENTS[segment["type"]]
+            duration = float(segment["duration"])
+            _positive("segment duration", duration)
+            ticks = np.arange(0, duration, self.resolution)
+            try:
+                parts.append(
+                    compile_segment(
+                        ticks, **{k: segment[k] for k in options if k in segment}
+                    )
+                )
+            except TypeError:
+                raise ValueError(
+                    f"Schedule segment '{segment['type']}' takes {', '.join(options)}."
+                )
+        if not parts:
+            raise ValueError("Schedule has no segments.")
+        rates = np.concatenate(parts)
+
+        for burst in schedule.get("bursts", []):
+            if burst["at"] < 0 or burst["duration"] < 0:
+                raise ValueError("Schedule bursts can't start or last below zero.")
+            start = int(burst["at"] / self.resolution)
+            end = start + max(1, int(burst["duration"] / self.resolution))
+            rates[start:end] += burst["rate"]
+
+        self.duration = len(rates) * self.resolution
+        self.rates = np.maximum(rates, 0).tolist()
+
+    def rate_at(self, elapsed: float) -> float:
+        """Target lines per second at a time into the schedule.
+
+        Args:
+            elapsed (float): Seconds since the schedule started.
+
+        Returns:
+            float: Target rate, zero once a schedule that doesn't repeat ends.
+        """
+        tick = int(elapsed / self.resolution)
+        if self.repeat:
+            return self.rates[tick % len(self.rates)]
+        return self.rates[tick] if tick < len(self.rates) else 0.0
@@ -0,0 +1,149 @@
+import io
+import multiprocessing
+import queue
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator
+
+# Read buffer for input files and pipes, large enough to cover many lines per read
+READ_BUFFER = 1 << 20
+# How requests can be spread across a generator's clients
+ACTIVITIES = ("zipf", "uniform")
+
+
+def _activity(value: str) -> str:
+    """Parse a generator spec's client activity, which must be one of ACTIVITIES."""
+    if value.lower() not in ACTIVITIES:
+        raise ValueError(
+            f"Unknown activity '{value}', choose from {', '.join(ACTIVITIES)}."
+        )
+    return value.lower()
+
+
+# Options a generator spec can set, and how to parse their values
+SPEC_OPTIONS = {
+    "iterations": int,
+    "start": int,
+    "seed": int,
+    "density": float,
+    "clients": int,
+    "activity": _activity,
+    "exponent": float,
+    "baddata": float,
+    "pool_size": int,
+    "realtime": lambda value: value.lower() in ("1", "true", "yes"),
+}
+
+
+def read_lines(inputfile: BinaryIO, binary: bool = True) -> Iterable:
+    """Lines of an input file or pipe.
+
+    Binary lines are passed through to the sinks without decoding. The file is
+    read through a large buffer so each read syscall covers many lines.
+
+    Args:
+        inputfile (BinaryIO): Input opened in binary mode.
+        binary (bool, optional): Yield bytes, else decode to str.
+        Defaults to True.
+
+    Returns:
+        Iterable: The newline terminated lines as bytes or str.
+    """
+    try:
+        lines = open(inputfile.fileno(), "rb", buffering=READ_BUFFER, closefd=False)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        lines = inputfile
+    return lines if binary else io.TextIOWrapper(lines, encoding="utf-8", newline="\n")
+
+
+def parse_generator_spec(spec: str) -> tuple:
+    """Parse a generator spec such as `apache,iterations=1000000,seed=42`.
+
+    The first item names the log type, the rest are key=value options for the
+    generator. Without `iterations` the generator runs until interrupted.
+
+    Args:
+        spec (str): Generator spec.
+
+    Raises:
+        ValueError: If the log type or an option is unknown or malformed.
+
+    Returns:
+        tuple: Name of the generator class and a dict of its options.
+    """
+    import generators
+
+    name, *pairs = spec.split(",")
+    try:
+        name = generators.log_types.resolve(name.strip())
+    except KeyError:
+        names = ", ".join(name.lower() for name in generators.log_types.names())
+        raise ValueError(f"Unknown log type '{name}', choose from {names}.")
+
+    options = dict(seed=4321, epoch=datetime.now(timezone.utc))
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        key = key.strip().replace("-", "_")
+        if key not in SPEC_OPTIONS or not value:
+            raise ValueError(f"Unknown generator option '{pair}'.")
+        options[key] = SPEC_OPTIONS[key](value.strip())
+    return name, options
+
+
+def _produce(name: str, options: dict, blocks: multiprocessing.Queue):
+    import generators
+
+    for _, rendered in getattr(generators, name)(**options).batches():
+        # Blocks when the sink falls behind, slowing generation down with it
+        blocks.put(rendered.encode("utf-8"))
+    blocks.put(None)
+
+
+class GeneratorSource:
+    def __init__(self, spec: str, backlog: int = 8, binary: bool = True):
+        """Log lines generated in a separate process, to stream without a pipe.
+
+        A producer process renders blocks of lines into a bounded queue, so
+        generation runs alongside the sink and pauses when the sink can't
+        keep up instead of buffering without limit.
+
+        Args:
+            spec (str): Generator spec, see parse_generator_spec.
+            backlog (int, optional): Max rendered blocks waiting for the sink.
+            Defaults to 8.
+            binary (bool, optional): Yield bytes, else decode to str.
+            Defaults to True.
+
+        Raises:
+            ValueError: If the spec is invalid.
+        """
+        self.name, self.options = parse_generator_spec(spec)
+        self.backlog = backlog
+        self.binary = binary
+
+    def __iter__(self) -> Iterator:
+        blocks = multiprocessing.Queue(self.backlog)
+        producer = multiprocessing.Process(
+            target=_produce, args=(self.name, self.options, blocks), daemon=True
+        )
+        producer.start()
+        try:
+            while True:
+                try:
+                    block = blocks.get(timeout=1)
+                except queue.Empty:
+                    if not producer.is_alive():
+                        raise RuntimeError(
+                            f"Log generator exited with code {producer.exitcode}."
+                        )
+                    continue
+                if block is None:
+                    break
+                # Split on newlines only, corrupted lines can hold other breaks
+                if self.binary:
+                    yield from io.BytesIO(block)
+                else:
+                    yield from io.StringIO(block.decode("utf-8"), newline="\n")
+            producer.join()
+        finally:
+            if producer.is_alive():
+                producer.terminate()
@@ -4,14 +4,14 @@ from streams.base import Output
 
 
 class Stdout(Output):
-    def __init__(self, rate: int, schedule):
-        super().__init__(rate=rate, schedule=schedule)
+    def __init__(self, rate: int, schedule, burst: int = None):
+        super().__init__(rate=rate, schedule=schedule, burst=burst)
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        stdout.flush()
+        stdout.buffer.flush()
 
-    def _send(self, logline: str):
-        stdout.write(logline)
+    def _send_batch(self, loglines: list):
+        stdout.buffer.write(self._joined(loglines))
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The tools import their modules relative to the scripts' directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "log_generator"))
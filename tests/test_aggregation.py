@@ -0,0 +1,76 @@
+import os
+
+import pytest
+from streams.aggregation import MAX_RECORD_BYTES, Aggregator, deaggregate
+
+
+def _lines(count: int, keys: int = 7) -> list:
+    return [
+        (f"10.0.0.{i % keys}".encode(), f"line {i} {'x' * (i % 50)}\n".encode())
+        for i in range(count)
+    ]
+
+
+def _aggregate(lines: list, format: str, limit: int = MAX_RECORD_BYTES) -> list:
+    aggregator = Aggregator(format, limit)
+    records = [aggregator.add(key, data) for key, data in lines]
+    return [record for record in records if record] + [aggregator.finish()]
+
+
+def test_kpl_round_trip():
+    lines = _lines(1000)
+    records = _aggregate(lines, "kpl")
+    assert len(records) == 1
+    assert deaggregate(*records[0]) == lines
+
+
+def test_lines_round_trip():
+    lines = _lines(1000)
+    records = _aggregate(lines, "lines")
+    assert len(records) == 1
+    key, data = records[0]
+    assert key == lines[0][0]
+    assert deaggregate(key, data) == [(key, line) for _, line in lines]
+
+
+@pytest.mark.parametrize("format", ["kpl", "lines"])
+def test_split_at_limit(format):
+    lines = _lines(1000)
+    records = _aggregate(lines, format, limit=2000)
+    assert len(records) > 1
+    for key, data in records:
+        assert len(key) + len(data) <= 2000
+    unpacked = [line for record in records for _, line in deaggregate(*record)]
+    assert unpacked == [line for _, line in lines]
+
+
+def test_split_re_emits_key_table():
+    # Every record after a split has to carry its own copy of the key
+    lines = [(b"client", f"line {i}\n".encode()) for i in range(500)]
+    records = _aggregate(lines, "kpl", limit=1000)
+    assert len(records) > 1
+    for key, data in records:
+        assert key == b"client"
+        assert all(line_key == b"client" for line_key, _ in deaggregate(key, data))
+    assert [line for r in records for line in deaggregate(*r)] == lines
+
+
+def test_split_at_record_limit():
+    big = [(b"key", os.urandom(400_000)) for _ in range(3)]
+    records = _aggregate(big, "kpl")
+    assert len(records) == 2
+    for key, data in records:
+        assert len(key) + len(data) <= MAX_RECORD_BYTES
+    assert [line for r in records for line in deaggregate(*r)] == big
+
+
+def test_corrupted_digest():
+    key, data = _aggregate(_lines(10), "kpl")[0]
+    corrupted = data[:-20] + bytes([data[-20] ^ 1]) + data[-19:]
+    with pytest.raises(ValueError):
+        deaggregate(key, corrupted)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        Aggregator("protobuf")
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+from streams.base import Output, RateLimiter
+
+
+class Collect(Output):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = []
+
+    def _send_batch(self, loglines):
+        self.sent.extend(loglines)
+
+
+def test_rate_is_held():
+    rate = 100000
+    sink = Collect(rate=rate)
+    lines = [b"line\n"] * rate
+    started = time.perf_counter()
+    sink.iterate(lines, 0)
+    elapsed = time.perf_counter() - started
+    assert len(sink.sent) == rate
+    assert rate / elapsed == pytest.approx(rate, rel=0.01)
+
+
+def test_limiter_admits_blocks_larger_than_a_burst():
+    limiter = RateLimiter(lambda elapsed: 10000, burst=50)
+    started = time.perf_counter()
+    assert sum(limiter.acquire(size) for size in [1, 999, 2000, 2000]) == 5000
+    assert time.perf_counter() - started == pytest.approx(0.5, rel=0.05)
+
+
+def test_limiter_stops_after_its_duration():
+    limiter = RateLimiter(lambda elapsed: 1000, duration=0.2)
+    assert limiter.acquire(10000) == pytest.approx(200, abs=20)
+    assert limiter.done
+
+
+def test_finite_schedule_ends_the_stream(tmp_path):
+    schedule = tmp_path / "schedule.json"
+    schedule.write_text(
+        '{"resolution": 0.1, "segments": [{"type": "constant", "rate": 1000, '
+        '"duration": 0.2}]}'
+    )
+    batches = []
+    with open(schedule) as file:
+        sink = Collect(schedule=file)
+    sink._send_batch = batches.append
+    sink.iterate([b"line\n"] * 10000, 0)
+    assert sum(map(len, batches)) == pytest.approx(200, abs=20)
+    assert all(batches)
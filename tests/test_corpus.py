@@ -0,0 +1,61 @@
+import io
+import subprocess
+import sys
+
+import pytest
+from corpus import Corpus, CorpusWriter, corpus_name
+from test_generate import EPOCH, GENERATE
+
+LINES = [b"first line\n", b"\n", "café   line\n".encode(), b"last\n"]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "test.log"
+    passed = io.BytesIO()
+    with CorpusWriter(path, passed) as writer:
+        writer.write(b"".join(LINES[:2]))
+        writer.write(b"".join(LINES[2:]).decode())
+    assert passed.getvalue() == b"".join(LINES)
+    return Corpus(path)
+
+
+def test_lines(corpus):
+    assert len(corpus) == len(LINES)
+    assert list(corpus.lines(0, len(corpus))) == LINES
+    assert list(corpus.lines(1, 3, binary=False)) == [
+        line.decode() for line in LINES[1:3]
+    ]
+
+
+def test_shards_cover_the_range(corpus):
+    shards = [corpus.shard(1, 100, shard, 2) for shard in range(2)]
+    assert shards == [(1, 2), (2, 4)]
+
+
+def test_failed_run_leaves_no_corpus(tmp_path):
+    path = tmp_path / "test.log"
+    with pytest.raises(RuntimeError):
+        with CorpusWriter(path, io.BytesIO()) as writer:
+            writer.write(LINES[0])
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_name_covers_every_option():
+    name = corpus_name("Apache", seed=1, iterations=10, baddata=None, clients=5)
+    assert name.startswith("apache-s1-i10-b0-")
+    assert name != corpus_name("Apache", seed=1, iterations=10, clients=6)
+
+
+def test_cached_run_is_replayed(tmp_path):
+    args = [sys.executable, str(GENERATE), "--epoch", EPOCH, "-q", "-l", "apache"]
+    args += ["-i", "15000", "-b", "10", "--cache-dir", str(tmp_path)]
+    first = subprocess.run(args, capture_output=True)
+    assert first.returncode == 0
+    (path,) = tmp_path.glob("*.log")
+    assert path.read_bytes() == first.stdout
+    replayed = subprocess.run(args, capture_output=True)
+    assert replayed.returncode == 0
+    assert replayed.stdout == first.stdout
+    assert len(first.stdout.splitlines()) == 15000
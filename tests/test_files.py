@@ -0,0 +1,37 @@
+import gzip
+
+import pytest
+from streams.files import Files
+
+
+def _files(tmp_path, **kwargs):
+    return Files(compressed=None, rate=None, schedule=None, path=tmp_path, **kwargs)
+
+
+def _written(tmp_path, suffix=".log"):
+    paths = sorted(tmp_path.glob(f"*{suffix}"))
+    assert not list(tmp_path.glob("*.tmp"))
+    return [
+        path.read_bytes() if suffix == ".log" else gzip.decompress(path.read_bytes())
+        for path in paths
+    ]
+
+
+@pytest.mark.parametrize("binary", [True, False])
+def test_max_bytes_counts_encoded_text(tmp_path, binary):
+    lines = ["café\n"] * 5
+    with _files(tmp_path, max_bytes=12, workers=1) as sink:
+        sink._send_batch([])
+        sink.send_batch([line.encode() for line in lines] if binary else lines)
+    assert _written(tmp_path) == [b"caf\xc3\xa9\n" * 2] * 2 + [b"caf\xc3\xa9\n"]
+
+
+def test_linecount_rotation_with_compression(tmp_path):
+    lines = [f"{i}\n".encode() for i in range(25)]
+    sink = Files(
+        compressed="gzip", rate=None, schedule=None, path=tmp_path, linecount=10
+    )
+    with sink:
+        sink.send_batch(lines[:7])
+        sink.send_batch(lines[7:])
+    assert b"".join(_written(tmp_path, ".log.gz")) == b"".join(lines)
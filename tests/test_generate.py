@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+GENERATE = Path(__file__).resolve().parent.parent / "log_generator" / "generate.py"
+# A fixed epoch, so runs give the same timestamps
+EPOCH = "2021-01-01T00:00:00"
+
+
+def _generate(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(GENERATE), "--epoch", EPOCH, "-q", *args],
+        capture_output=True,
+    )
+
+
+@pytest.mark.parametrize("log_type", ["apache", "cloudflare"])
+def test_workers_match_a_single_process(log_type):
+    args = ["-l", log_type, "-i", "25000", "-b", "10"]
+    single = _generate(*args)
+    parallel = _generate(*args, "-w", "3")
+    assert single.returncode == parallel.returncode == 0
+    assert len(single.stdout.splitlines()) == 25000
+    assert parallel.stdout == single.stdout
+
+
+@pytest.mark.parametrize("workers", ["0", "-1"])
+def test_workers_at_least_one(workers):
+    result = _generate("-l", "apache", "-w", workers)
+    assert result.returncode == 2
+    assert b"--workers" in result.stderr
+
+
+@pytest.mark.parametrize("start", ["0", "9990", "12345"])
+def test_start_resumes_a_run(start):
+    args = ["-l", "apache", "-b", "10"]
+    full = _generate(*args, "-i", "25000").stdout.splitlines(keepends=True)
+    resumed = _generate(*args, "--start", start, "-i", "5000")
+    assert resumed.returncode == 0
+    assert resumed.stdout == b"".join(full[int(start) : int(start) + 5000])
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from aiohttp import web
+from streams.http import HTTP
+
+
+class Collector:
+    """Local HTTP collector recording the requests it accepts."""
+
+    def __init__(self):
+        self.requests = []
+        # Statuses answered, with Retry-After, before requests are accepted
+        self.statuses = []
+
+    async def ingest(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if self.statuses:
+            return web.Response(
+                status=self.statuses.pop(0), headers={"Retry-After": "0"}
+            )
+        self.requests.append((request.headers.copy(), body))
+        return web.Response(text="ok")
+
+    def lines(self) -> list:
+        return [line for _, body in self.requests for line in body.splitlines()]
+
+
+@pytest.fixture
+def collector():
+    collector = Collector()
+    app = web.Application()
+    app.add_routes([web.post("/logs", collector.ingest)])
+    runner = web.AppRunner(app)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+    host, port = runner.addresses[0][:2]
+    collector.url = f"http://{host}:{port}/logs"
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield collector
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _lines(count: int) -> list:
+    return [f"10.0.0.{i % 10} - - line {i}\n".encode() for i in range(count)]
+
+
+def _send(url: str, lines: list, **kwargs) -> HTTP:
+    with HTTP(url, stats_interval=0, **kwargs) as sink:
+        for start in range(0, len(lines), 1000):
+            sink.send_batch(lines[start : start + 1000])
+    return sink
+
+
+def test_ndjson_bodies(collector):
+    lines = _lines(2500) + [b'{"ClientIP":"10.0.0.1"}\n']
+    sink = _send(collector.url, lines)
+    for headers, _ in collector.requests:
+        assert headers["Content-Type"] == "application/x-ndjson"
+    # Requests are made concurrently, so they can arrive in any order
+    objects = [json.loads(line) for line in collector.lines()]
+    expected = [{"message": line.decode().rstrip()} for line in lines[:-1]]
+    assert sorted(map(str, objects)) == sorted(
+        map(str, expected + [{"ClientIP": "10.0.0.1"}])
+    )
+    assert sink.stats.acked == len(lines)
+
+
+def test_gzip_bodies(collector):
+    lines = _lines(2500)
+    _send(collector.url, lines, format="lines", compressed=True)
+    for headers, _ in collector.requests:
+        assert headers["Content-Encoding"] == "gzip"
+    # The collector decompresses the bodies as it reads them
+    assert sorted(collector.lines()) == sorted(line.rstrip(b"\n") for line in lines)
+
+
+def test_batch_size(collector):
+    lines = _lines(1000)
+    _send(collector.url, lines, format="lines", batch_size=100)
+    assert len(collector.requests) == 10
+    assert all(len(body.splitlines()) == 100 for _, body in collector.requests)
+
+
+def test_max_body(collector):
+    lines = _lines(1000)
+    _send(collector.url, lines, format="lines", max_body=1000)
+    assert len(collector.requests) > 1
+    assert all(len(body) <= 1000 for _, body in collector.requests)
+    assert sorted(collector.lines()) == sorted(line.rstrip(b"\n") for line in lines)
+
+
+def test_retries_busy_collector(collector):
+    collector.statuses = [503, 429]
+    lines = _lines(100)
+    sink = _send(collector.url, lines, format="lines")
+    assert sink.stats.retried == 2
+    assert sink.stats.acked == len(lines)
+    assert collector.lines() == [line.rstrip(b"\n") for line in lines]
+
+
+def test_rejected_request_raises(collector):
+    collector.statuses = [400]
+    with pytest.raises(RuntimeError, match="400"):
+        _send(collector.url, _lines(100))
+    assert not collector.requests
@@ -0,0 +1,25 @@
+from itertools import islice
+
+from streams.kafka_confluent import _pack, _unpack
+
+LINES = [b"first line\n", b"", "café\n".encode(), b"last\n"]
+
+
+def test_unkeyed_blocks():
+    lines, keys, partitions = _unpack(_pack(LINES))
+    assert lines == LINES
+    assert list(islice(keys, len(LINES))) == [None] * len(LINES)
+    assert list(islice(partitions, len(LINES))) == [-1] * len(LINES)
+
+
+def test_keyed_blocks():
+    keys = [b"10.0.0.1", b"", b"10.0.0.22", b"k"]
+    lines, unpacked, partitions = _unpack(_pack(LINES, keys, [3, 0, 1, 2]))
+    assert lines == LINES
+    assert unpacked == keys
+    assert list(partitions) == [3, 0, 1, 2]
+
+
+def test_empty_blocks():
+    assert _unpack(_pack([]))[0] == []
+    assert _unpack(_pack([], [], []))[:2] == ([], [])
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+from streams.aggregation import deaggregate
+from streams.kinesis import Kinesis
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    """Kinesis sink with two shards, collecting records rather than sending."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(Kinesis, "_shard_starts", lambda self: [0, 2**127])
+
+    def make(**kwargs) -> Kinesis:
+        sink = Kinesis("stream", key="apache", **kwargs)
+        sink.sent = []
+        sink._put_records = sink.sent.extend
+        return sink
+
+    return make
+
+
+def _lines(count: int) -> list:
+    return [f"10.0.0.{i % 10} - - line {i}\n".encode() for i in range(count)]
+
+
+def _unpacked(records: list) -> list:
+    return [
+        line
+        for record in records
+        for _, line in deaggregate(record["PartitionKey"].encode(), record["Data"])
+    ]
+
+
+def test_partial_records_wait_for_max_buffered_time(sink):
+    with sink(aggregate="kpl", max_buffered_time=0.05) as kinesis:
+        kinesis.send_batch(_lines(10))
+        assert not kinesis.pending
+        time.sleep(0.06)
+        kinesis.send_batch(_lines(10))
+        while kinesis.pending:
+            kinesis.pending.popleft().result()
+        assert sorted(_unpacked(kinesis.sent)) == sorted(_lines(10) * 2)
+
+
+def test_unaggregated_requests_wait_for_max_buffered_time(sink):
+    with sink(max_buffered_time=0.05) as kinesis:
+        kinesis.send_batch(_lines(10))
+        assert not kinesis.pending
+        time.sleep(0.06)
+        kinesis.send_batch(_lines(1))
+        assert kinesis.pending
+
+
+def test_no_max_buffered_time_only_sends_full_records(sink):
+    with sink(aggregate="kpl", max_buffered_time=0) as kinesis:
+        kinesis.send_batch(_lines(10))
+        time.sleep(0.01)
+        kinesis.send_batch(_lines(10))
+        assert not kinesis.pending
+    assert sorted(_unpacked(kinesis.sent)) == sorted(_lines(10) * 2)
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+from aiohttp import web
+from streams.s3 import MIN_PART_SIZE, S3
+
+
+def _unchunk(data: bytes) -> bytes:
+    """Body of an aws-chunked request, without its chunk headers."""
+    body = b""
+    while True:
+        header, data = data.split(b"\r\n", 1)
+        size = int(header.split(b";")[0], 16)
+        if not size:
+            return body
+        body, data = body + data[:size], data[size + 2 :]
+
+
+class Bucket:
+    """Local S3 stand-in keeping objects and multipart uploads in memory."""
+
+    def __init__(self):
+        self.objects = {}
+        self.encodings = {}
+        self.uploads = {}
+        self.aborted = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        key, query = request.match_info["key"], request.query
+        # Gzipped bodies are decompressed by aiohttp as they're read
+        body = await request.read()
+        if "aws-chunked" in request.headers.get("Content-Encoding", ""):
+            body = _unchunk(body)
+        if request.method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return web.Response(
+                text="<InitiateMultipartUploadResult><Key>{}</Key><UploadId>{}"
+                "</UploadId></InitiateMultipartUploadResult>".format(key, upload_id)
+            )
+        if request.method == "POST":
+            parts = self.uploads.pop(query["uploadId"])
+            self.objects[key] = b"".join(parts[n] for n in sorted(parts))
+            return web.Response(
+                text="<CompleteMultipartUploadResult><ETag>&quot;x&quot;</ETag>"
+                "</CompleteMultipartUploadResult>"
+            )
+        if request.method == "DELETE":
+            del self.uploads[query["uploadId"]]
+            self.aborted.append(key)
+            return web.Response(status=204)
+        if "partNumber" in query:
+            self.uploads[query["uploadId"]][int(query["partNumber"])] = body
+        else:
+            self.objects[key] = body
+            self.encodings[key] = request.headers.get("Content-Encoding")
+        return web.Response(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    bucket = Bucket()
+    app = web.Application(client_max_size=2 * MIN_PART_SIZE)
+    app.add_routes([web.route("*", "/logs/{key:.+}", bucket.handle)])
+    runner = web.AppRunner(app)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+    host, port = runner.addresses[0][:2]
+    bucket.url = f"http://{host}:{port}"
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield bucket
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _lines(count: int) -> list:
+    return [f"10.0.0.{i % 10} - - line {i:<80}\n".encode() for i in range(count)]
+
+
+def _sink(bucket: Bucket, **kwargs) -> S3:
+    return S3(
+        "logs", "test/", endpoint_url=bucket.url, part_size=MIN_PART_SIZE, **kwargs
+    )
+
+
+def test_objects_are_put(bucket):
+    lines = _lines(25)
+    with _sink(bucket, key_line_count=10, compressed=True) as sink:
+        sink.send_batch(lines)
+    keys = sorted(bucket.objects)
+    assert [bucket.encodings[key] for key in keys] == ["gzip"] * 3
+    assert [len(bucket.objects[key].splitlines()) for key in keys] == [10, 10, 5]
+    assert b"".join(bucket.objects[key] for key in keys) == b"".join(lines)
+
+
+def test_large_objects_are_uploaded_in_parts(bucket):
+    lines = _lines(120000)
+    with _sink(bucket, key_line_count=len(lines)) as sink:
+        for start in range(0, len(lines), 1000):
+            sink.send_batch(lines[start : start + 1000])
+    (data,) = bucket.objects.values()
+    assert data == b"".join(lines)
+    assert not bucket.uploads
+
+
+def test_open_uploads_are_aborted_after_a_failure(bucket):
+    lines = _lines(80000)
+    with pytest.raises(RuntimeError):
+        with _sink(bucket, key_line_count=2 * len(lines)) as sink:
+            sink.send_batch(lines)
+            raise RuntimeError
+    assert not bucket.objects
+    assert not bucket.uploads
+    assert len(bucket.aborted) == 1
@@ -0,0 +1,60 @@
+import pytest
+from streams.schedule import Timeline
+
+
+def test_segments_play_in_order():
+    timeline = Timeline(
+        {
+            "segments": [
+                {"type": "ramp", "start": 0, "end": 100, "duration": 4},
+                {"type": "step", "rates": [5, 10], "interval": 2, "duration": 6},
+            ],
+            "bursts": [{"at": 1, "duration": 2, "rate": 1000}],
+        }
+    )
+    assert timeline.duration == 10
+    assert timeline.rates == [0, 1025, 1050, 75, 5, 5, 10, 10, 5, 5]
+    assert timeline.rate_at(3.5) == 75
+    assert timeline.rate_at(10) == 0
+
+
+def test_legacy_schedules_repeat():
+    timeline = Timeline({"update_interval": 2, "schedule": [1, 2]})
+    assert timeline.repeat
+    assert [timeline.rate_at(t) for t in range(6)] == [1, 1, 2, 2, 1, 1]
+
+
+def test_resolution():
+    timeline = Timeline(
+        {
+            "resolution": 0.5,
+            "segments": [{"type": "constant", "rate": 7, "duration": 2}],
+        }
+    )
+    assert timeline.rates == [7] * 4
+    assert timeline.rate_at(1.9) == 7
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    [
+        {"resolution": 0, "segments": [{"type": "constant", "rate": 1, "duration": 1}]},
+        {"segments": [{"type": "step", "rates": [], "interval": 1, "duration": 1}]},
+        {"segments": [{"type": "step", "rates": [1], "interval": 0, "duration": 1}]},
+        {"segments": [{"type": "constant", "rate": 1, "duration": -1}]},
+        {
+            "segments": [
+                {"type": "sine", "base": 1, "amplitude": 1, "period": 0, "duration": 1}
+            ]
+        },
+        {
+            "segments": [{"type": "constant", "rate": 1, "duration": 1}],
+            "bursts": [{"at": 0, "duration": -1, "rate": 1}],
+        },
+        {"segments": [{"type": "wave", "duration": 1}]},
+        {"segments": []},
+    ],
+)
+def test_invalid_schedules(schedule):
+    with pytest.raises(ValueError):
+        Timeline(schedule)
@@ -0,0 +1,33 @@
+import io
+
+import pytest
+from streams.sources import GeneratorSource, parse_generator_spec, read_lines
+
+
+def test_spec_options():
+    name, options = parse_generator_spec("apache,iterations=10,activity=Uniform")
+    assert name == "Apache"
+    assert options["iterations"] == 10
+    assert options["activity"] == "uniform"
+
+
+@pytest.mark.parametrize(
+    "spec", ["apache,activity=zpif", "apache,nope=1", "apache,seed=", "nope"]
+)
+def test_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_generator_spec(spec)
+
+
+def test_text_lines_only_split_on_newlines():
+    data = "a\u2028b\x1cc\rd\n2\n".encode()
+    assert list(read_lines(io.BytesIO(data), binary=False)) == [
+        "a\u2028b\x1cc\rd\n",
+        "2\n",
+    ]
+
+
+def test_generated_text_lines():
+    lines = list(GeneratorSource("apache,iterations=2000,baddata=20", binary=False))
+    assert len(lines) == 2000
+    assert all(line.endswith("\n") and line.count("\n") == 1 for line in lines)
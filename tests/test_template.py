@@ -0,0 +1,24 @@
+import pytest
+from generators.template import Template
+
+
+def test_static_format():
+    assert Template("static only 100%").render({}, 3) == "static only 100%\n" * 3
+
+
+def test_literal_percent_around_fields():
+    template = Template("{user_name} 100% {{done}}")
+    columns = {"user_name": ["alice", "bob"]}
+    assert template.render(columns, 2) == "alice 100% {done}\nbob 100% {done}\n"
+
+
+def test_filters():
+    template = Template("{transfer_size:number} {http_method:lower}")
+    columns = {"transfer_size": ["-", "512"], "http_method": ["GET", "POST"]}
+    assert template.render(columns, 2) == "0 get\n512 post\n"
+
+
+@pytest.mark.parametrize("spec", ["{nope}", "{user_name:shout}", "{user_name!r}"])
+def test_invalid_formats(spec):
+    with pytest.raises(ValueError):
+        Template(spec)